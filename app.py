@@ -1,176 +1,312 @@
+import io
+import os
+import pandas as pd
 import streamlit as st
-from utils.file_handler import save_temporary_file, delete_temporary_file
-from utils.transaction_extractor import extract_transactions_from_pdf, extract_transactions_from_csv
-from utils.ui_components import display_transaction_table
+from utils.file_handler import open_upload, get_bytes_hash
+from utils.transaction_extractor import STATEMENT_FORMATS, detect_format
+from utils.extraction_cache import ExtractionCache, extract_with_cache
+from utils.ui_components import display_job_progress, display_transaction_table, display_performance_panel, display_spending_analytics
+from utils.analytics import monthly_totals
 from utils.categoriser import categorize_transactions, save_approved_patterns
-import os
+from utils.job_queue import JobQueue
+from utils.logging_config import configure_logging
+from utils.metrics import Metrics
+from utils.rules_store import get_rules_store
+from utils.schema import to_canonical
+from utils.warehouse import TransactionWarehouse
 
 st.set_page_config(page_title="Finance Tracker", page_icon="💰", layout="wide")
 
+CATEGORIES_FILE = "categories.json"
+LLM_MODEL = "gemma3"
+WAREHOUSE_FILE = "warehouse.db"
+EXTRACTION_CACHE_DIR = ".extraction_cache"
+LOG_FILE = "finance_tracker.log"
+# Statements processed at once in the background
+JOB_WORKERS = 2
+# Processes each of them may extract a long PDF's pages with, so all jobs together use at most every CPU
+PAGE_WORKERS = max(1, (os.cpu_count() or 1) // JOB_WORKERS)
+# Seconds between progress updates while statements are processing
+PROGRESS_REFRESH_SECONDS = 1
+# Share of a statement's progress bar taken by extraction; categorisation fills the rest
+EXTRACTION_SHARE = 0.3
+# What a statement's job does next once the categoriser reports each stage
+NEXT_STAGE = {
+    "store_lookup": "Matching account terms",
+    "pass1_account_terms": "Matching learned patterns",
+    "pass2_learned_patterns": "Matching category patterns",
+    "pass3_categories": "Asking the LLM",
+    "pass4_llm": "Saving to the warehouse",
+}
+# Months of history searched for recurring payments
+RECURRING_LOOKBACK_MONTHS = 13
+# "summary", "pattern" or "row"; see utils.logging_config
+LOG_VERBOSITY = "summary"
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def detect_uploaded_format(file_hash, _uploaded_file):
+    """
+    Return the statement format of an uploaded file, or None, memoised on its content hash.
+    """
+    return detect_format(_uploaded_file)
+
+@st.cache_resource
+def get_job_queue():
+    """Return the background job queue shared by every session of the server."""
+    return JobQueue(max_workers=JOB_WORKERS)
+
+def process_upload(job, file_hash, statement_format, account_type, upload, llm_model):
+    """
+    Extract and categorise one uploaded statement, reporting progress on its job.
+
+    Runs on a JobQueue thread. The result is also saved to the local transaction warehouse.
+
+    Args:
+        job (Job): The job running this upload.
+        file_hash (str): SHA-256 of the file contents.
+        statement_format (str): Detected format, a key of STATEMENT_FORMATS.
+        account_type (str): The type of account.
+        upload (BytesIO): The file contents.
+        llm_model (str): Name of the LLM model to use.
+
+    Returns:
+        dict: 'extracted' and 'categorized' DataFrames, 'new_patterns' and 'stats' (whose
+              'metrics' cover extraction too), or None if no transactions were extracted.
+    """
+    metrics = Metrics()
+    job.update("Extracting transactions", 0.0)
+    registered = STATEMENT_FORMATS[statement_format]
+    # A long PDF's pages are extracted on workers that are not forked from this thread
+    extract_options = {"workers": PAGE_WORKERS} if registered["kind"] == "pdf" else {}
+    with open_upload(upload) as source:
+        # The disk cache outlives the server, so re-uploads after a restart skip parsing too
+        extracted_transactions = extract_with_cache(
+            registered["extractor"], source, ExtractionCache(EXTRACTION_CACHE_DIR),
+            file_hash=file_hash, metrics=metrics, debug=False, **extract_options
+        )
+
+    if extracted_transactions is None or extracted_transactions.empty:
+        return None
+
+    # Add account type to the dataframe
+    extracted_transactions["Account Type"] = account_type
+    to_canonical(extracted_transactions)
+    total = len(extracted_transactions)
+    job.update(f"Extracted {total} transactions", EXTRACTION_SHARE)
+
+    def report(stage, uncategorized):
+        job.update(
+            f"{NEXT_STAGE[stage]} ({uncategorized} of {total} transactions left)",
+            EXTRACTION_SHARE + (1 - EXTRACTION_SHARE) * (1 - uncategorized / total)
+        )
+
+    categorized_df, new_patterns, stats = categorize_transactions(
+        extracted_transactions.copy(), account_type, categories_file=CATEGORIES_FILE, llm_model=llm_model,
+        metrics=metrics, progress=report
+    )
+
+    warehouse = TransactionWarehouse(WAREHOUSE_FILE)
+    try:
+        warehouse.add_transactions(categorized_df, account_type)
+    finally:
+        warehouse.close()
+
+    return {
+        "extracted": extracted_transactions,
+        "categorized": categorized_df,
+        "new_patterns": new_patterns,
+        "stats": stats,
+    }
+
+def retry_upload(job):
+    """Forget a failed upload's job and rerun the page, which submits it again."""
+    get_job_queue().forget(job.key)
+    st.rerun()
+
+@st.fragment(run_every=PROGRESS_REFRESH_SECONDS)
+def display_upload_progress(job_ids):
+    """
+    Redraw the progress of the given jobs every PROGRESS_REFRESH_SECONDS without rerunning the page.
+
+    Once another job has finished successfully the whole page reruns, so its results
+    appear; failed jobs show their error here and have nothing new for the page.
+    """
+    jobs = get_job_queue().jobs(job_ids)
+    display_job_progress(jobs, on_retry=retry_upload)
+
+    if {job.id for job in jobs if job.status == "done"} != st.session_state.shown_jobs:
+        st.rerun()
+
+def display_upload_result(job):
+    """Display the categorised transactions of one finished upload."""
+    result = job.result
+    if result is None:
+        st.error("No transactions were extracted from the file. Please check the file format.")
+        return
+
+    stats = result["stats"]
+    file_hash = job.key[0]
+
+    # Show categorization stats
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total Transactions", stats["total"])
+    with col2:
+        st.metric("Auto-categorized", f"{stats['pattern_percent']}%")
+    with col3:
+        st.metric("AI-categorized", f"{stats['llm_percent']}%")
+
+    # Show where the time went, for extraction and categorization together
+    display_performance_panel(stats["metrics"])
+
+    # Toggle for showing raw data
+    if st.checkbox("Show extracted data", value=False, key=f"show_extracted_{file_hash}"):
+        st.subheader("Extracted Transactions")
+        display_transaction_table(result["extracted"], key=f"extracted_{file_hash}")
+
+    # Display categorized transactions
+    st.subheader("Categorized Transactions")
+    display_transaction_table(result["categorized"], key=f"categorized_{file_hash}")
+
 def main():
+    configure_logging(LOG_FILE, verbosity=LOG_VERBOSITY)
     st.title("Finance Tracker")
 
-    # Initialize session state for categorization status
-    if 'categorization_complete' not in st.session_state:
-        st.session_state.categorization_complete = False
+    queue = get_job_queue()
+    uploads = []
 
-    account_type = ""
-    extracted_transactions = None
-    
     with st.sidebar:
-        st.header("Upload Your File")
-        uploaded_file = st.file_uploader("Choose a bank statement", type=["pdf", "csv"])
+        st.header("Upload Your Files")
+        uploaded_files = st.file_uploader("Choose bank statements", type=["pdf", "csv"], accept_multiple_files=True)
+
+        account_types = sorted({registered["account_type"] for registered in STATEMENT_FORMATS.values()})
+        seen_hashes = set()
+        for uploaded_file in uploaded_files or []:
+            file_hash = get_bytes_hash(uploaded_file.getbuffer())
+            if file_hash in seen_hashes:
+                st.caption(f"{uploaded_file.name}: same contents as another upload, skipped")
+                continue
+            seen_hashes.add(file_hash)
+
+            try:
+                statement_format = detect_uploaded_format(file_hash, uploaded_file)
+            except Exception as e:
+                st.error(f"{uploaded_file.name}: could not be read ({e}). Please check the file.")
+                continue
+
+            format_source = "detected" if statement_format is not None else "selected"
+            if statement_format is None:
+                # The sniffers only know some layouts; let the user say which parser to use
+                formats = list(STATEMENT_FORMATS)
+                statement_format = st.selectbox(
+                    f"Statement format of {uploaded_file.name} (not recognised)",
+                    options=formats, index=None, placeholder="Choose a format",
+                    key=f"statement_format_{file_hash}"
+                )
+                if statement_format is None:
+                    continue
 
-        if uploaded_file is not None:
-            # After file upload, ask the user to select the account type
+            # The format suggests the account type; the user can still change it
             account_type = st.selectbox(
-                "Select Account Type", 
-                options=["", "A", "B", "C", "D"],
-                index=0
+                f"Account type of {uploaded_file.name} ({format_source}: {statement_format})",
+                options=account_types,
+                index=account_types.index(STATEMENT_FORMATS[statement_format]["account_type"]),
+                key=f"account_type_{file_hash}"
             )
+            uploads.append((uploaded_file, file_hash, statement_format, account_type))
+
+        if st.button("Clear cached results"):
+            queue.clear()
+            ExtractionCache(EXTRACTION_CACHE_DIR).clear()
+
+    if not uploads:
+        return
+
+    # Each statement is processed once per rules version and model; reruns and other sessions reuse the job
+    rules_hash = get_rules_store(CATEGORIES_FILE).rules_hash()
+    jobs = []
+    for uploaded_file, file_hash, statement_format, account_type in uploads:
+        key = (file_hash, statement_format, account_type, rules_hash, LLM_MODEL)
+        # Only a new job gets its own copy of the upload, which stays in use by this script.
+        # A failed job is found too, so it is only redone when the user retries it
+        job = queue.find(key) or queue.submit(
+            uploaded_file.name, process_upload, file_hash, statement_format, account_type,
+            io.BytesIO(uploaded_file.getvalue()), LLM_MODEL, key=key
+        )
+        jobs.append(job)
+
+    st.session_state.shown_jobs = {job.id for job in jobs if job.status == "done"}
+    if all(job.done for job in jobs):
+        display_job_progress([job for job in jobs if job.status == "failed"], on_retry=retry_upload)
+    else:
+        display_upload_progress([job.id for job in jobs])
+
+    # Results appear as statements finish
+    finished = [job for job in jobs if job.status == "done"]
+    if not finished:
+        return
+
+    for tab, job in zip(st.tabs([job.name for job in finished]), finished):
+        with tab:
+            display_upload_result(job)
+
+    # Trends over this session's statements only: the warehouse is shared by every user of the server
+    session_transactions = [job.result["categorized"] for job in finished if job.result]
+    if session_transactions:
+        transactions = pd.concat(session_transactions, ignore_index=True)
+        since = pd.Timestamp.today().normalize() - pd.DateOffset(months=RECURRING_LOOKBACK_MONTHS)
+        rules = get_rules_store(CATEGORIES_FILE).load() or {}
+        display_spending_analytics(
+            monthly_totals(transactions), transactions[transactions["Date"] >= since], rules.get("budgets")
+        )
+
+    # The first statement to suggest a merchant decides its category
+    suggested = {}
+    for job in finished:
+        for merchant, category in job.result["new_patterns"] if job.result else []:
+            suggested.setdefault(merchant, category)
+    new_patterns = list(suggested.items())
+
+    # Create a section for approving new patterns
+    if new_patterns:
+        st.subheader("Review New Patterns")
+        
+        # Store selected patterns in session state
+        if "selected_patterns" not in st.session_state:
+            st.session_state.selected_patterns = [False] * len(new_patterns)
+        elif len(st.session_state.selected_patterns) != len(new_patterns):
+            # Update if number of patterns changed
+            st.session_state.selected_patterns = [False] * len(new_patterns)
+
+        with st.form("pattern_form"):
+            st.write("The following new merchant patterns were detected. Select which ones to approve:")
+
+            col1, col2 = st.columns(2)
+
+            for i, pattern in enumerate(new_patterns):
+                merchant, category = pattern
+
+                with col1 if i % 2 == 0 else col2:
+                    st.session_state.selected_patterns[i] = st.checkbox(
+                        f"{merchant} → {category}", 
+                        value=st.session_state.selected_patterns[i],
+                        key=f"pattern_{i}"
+                    )
+
+            submit_button = st.form_submit_button("Save Approved Patterns")
+
+        if submit_button:
+
+            approved_patterns = [
+                new_patterns[i] for i in range(len(new_patterns)) 
+                if st.session_state.selected_patterns[i]
+            ]
 
-    # Proceed only if an account type is selected  
-    if uploaded_file is not None and account_type:
-        try:
-            temporary_file_path = save_temporary_file(uploaded_file)
-            
-            st.info("Extracting transactions from the file...")
-            
-            with st.spinner("Processing..."):
-                if account_type == "A":
-                    extracted_transactions = extract_transactions_from_pdf(temporary_file_path, debug=False)
-                elif account_type == "B":
-                    # Implement extraction for account type B
-                    st.warning("Extraction for account type B not yet implemented")
-                    pass
-                elif account_type == "C":
-                    extracted_transactions = extract_transactions_from_csv(temporary_file_path, debug=False)
-                elif account_type == "D":
-                    # Implement extraction for account type D not yet implemented
-                    st.warning("Extraction for account type D not yet implemented")
-                    pass
-                else:
-                    st.error("Invalid account type selected.")
-                    if os.path.exists(temporary_file_path):
-                        delete_temporary_file(temporary_file_path)
-                    return
-                    
-            # Only delete file after successful extraction
-            if os.path.exists(temporary_file_path):
-                delete_temporary_file(temporary_file_path)
-            
-            # Check if extraction was successful
-            if extracted_transactions is not None and not extracted_transactions.empty:
-                st.success("Transactions extracted successfully!")
-                
-                # Add account type to the dataframe
-                extracted_transactions["Account Type"] = account_type
-                
-                # Toggle for showing raw data
-                if st.checkbox("Show raw extracted data", value=False):
-                    st.subheader("Raw Extracted Transactions")
-                    st.dataframe(extracted_transactions)
-                
-                # Display formatted transactions
-                st.subheader("Extracted Transactions")
-                display_transaction_table(extracted_transactions)
-                
-                # Categorize transactions if extraction was successful and not already categorized
-                if not st.session_state.categorization_complete:  # Assuming account type D has categories already
-                    try:
-                       
-                        with st.spinner("Categorizing transactions..."):
-                            categorized_df, new_patterns, stats = categorize_transactions(
-                                extracted_transactions, account_type
-                            )
-                            # Mark categorization as complete
-                            st.session_state.categorization_complete = True
-                            
-                        if categorized_df is not None:
-                            st.success("Transactions categorized successfully!")
-                           
-                            col1, col2, col3 = st.columns(3)
-                            with col1:
-                                st.metric("Total Transactions", stats["total"])
-                            with col2:
-                                st.metric("Auto-categorized", f"{stats['pattern_percent']}%")
-                            with col3:
-                                st.metric("AI-categorized", f"{stats['llm_percent']}%")
-                            
-                            st.subheader("Categorized Transactions")
-                            display_transaction_table(categorized_df)
-                    except Exception as e:
-                        st.error(f"Error during categorization: {str(e)}")
-                        st.session_state.categorization_complete = False
-                
-                elif st.session_state.categorization_complete:
-                    try:
-                        categorized_df, new_patterns, stats = categorize_transactions(
-                            extracted_transactions, account_type
-                        )
-                        
-                        if categorized_df is not None:
-                            st.success("Transactions categorized successfully!")
-                            
-                            # Show categorization stats
-                            col1, col2, col3 = st.columns(3)
-                            with col1:
-                                st.metric("Total Transactions", stats["total"])
-                            with col2:
-                                st.metric("Auto-categorized", f"{stats['pattern_percent']}%")
-                            with col3:
-                                st.metric("AI-categorized", f"{stats['llm_percent']}%")
-                            
-                            # Display categorized transactions
-                            st.subheader("Categorized Transactions")
-                            display_transaction_table(categorized_df)
-                    except Exception as e:
-                        st.error(f"Error displaying categorized transactions: {str(e)}")
-                
-                # Create a section for approving new patterns
-                if 'new_patterns' in locals() and new_patterns:
-                    st.subheader("Review New Patterns")
-                    
-                    # Store selected patterns in session state
-                    if "selected_patterns" not in st.session_state:
-                        st.session_state.selected_patterns = [False] * len(new_patterns)
-                    elif len(st.session_state.selected_patterns) != len(new_patterns):
-                        # Update if number of patterns changed
-                        st.session_state.selected_patterns = [False] * len(new_patterns)
-                    
-                    with st.form("pattern_form"):
-                        st.write("The following new merchant patterns were detected. Select which ones to approve:")
-                        
-                        col1, col2 = st.columns(2)
-                        
-                        for i, pattern in enumerate(new_patterns):
-                            merchant, category = pattern
-                    
-                            with col1 if i % 2 == 0 else col2:
-                                st.session_state.selected_patterns[i] = st.checkbox(
-                                    f"{merchant} → {category}", 
-                                    value=st.session_state.selected_patterns[i],
-                                    key=f"pattern_{i}"
-                                )
-                        
-                        submit_button = st.form_submit_button("Save Approved Patterns")
-                        
-                    if submit_button:
-                     
-                        approved_patterns = [
-                            new_patterns[i] for i in range(len(new_patterns)) 
-                            if st.session_state.selected_patterns[i]
-                        ]
-                        
-                        if approved_patterns:
-                            save_approved_patterns(approved_patterns)
-                            st.success(f"Saved {len(approved_patterns)} approved patterns!")
-                        else:
-                            st.warning("No patterns were approved for saving.")
+            if approved_patterns:
+                save_approved_patterns(approved_patterns, CATEGORIES_FILE)
+                st.success(f"Saved {len(approved_patterns)} approved patterns!")
             else:
-                st.error("No transactions were extracted from the file. Please check the file format.")
-        except Exception as e:
-            st.error(f"An error occurred: {str(e)}")
+                st.warning("No patterns were approved for saving.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,381 @@
+"""
+Headless batch processing of bank statements.
+
+Detects the format of every matching PDF/CSV statement, extracts and categorises
+them on a process pool and writes the combined result to Parquet or CSV, printing
+per-file timings. --map overrides the account type a detected format implies.
+
+Formats that can be parsed in chunks, such as Revolut CSV exports, are categorised
+and written one chunk at a time, so a large export never has to fit in memory.
+
+Example:
+    python batch_process.py statements/ "archive/*.csv" --map "*joint*=B" -o transactions.parquet
+"""
+import argparse
+import fnmatch
+import glob
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from utils.categoriser import categorize_transactions
+from utils.extraction_cache import ExtractionCache, extract_with_cache
+from utils.logging_config import VERBOSITY_LEVELS, configure_logging
+from utils.metrics import Metrics, write_prometheus
+from utils.schema import to_canonical
+from utils.transaction_extractor import STATEMENT_FORMATS, detect_format, formats_for_account_type
+
+# File extensions picked up from directories and glob patterns
+STATEMENT_EXTENSIONS = (".pdf", ".csv")
+
+# Rows per chunk when a statement is streamed
+CHUNK_ROWS = 100_000
+
+class TransactionWriter:
+    """
+    Appends transactions to a Parquet or CSV file, chosen by file extension, one DataFrame at a time.
+
+    Only the DataFrame being written is held in memory. Parquet output needs pyarrow;
+    every write after the first is cast to the first one's columns.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._parquet = path.lower().endswith(".parquet")
+        self._writer = None
+
+    def write(self, df):
+        """Append a DataFrame with the same columns as the ones already written."""
+        to_canonical(df)
+        if not self._parquet:
+            df.to_csv(self.path, mode="a" if self.rows else "w", header=not self.rows, index=False)
+            self.rows += len(df)
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, widen_dictionaries(table.schema))
+        table = table.cast(self._writer.schema)
+        self._writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        """Finish the file; a Parquet file is not readable before this."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def widen_dictionaries(schema):
+    """
+    Return a schema whose categorical columns fit any later chunk.
+
+    A chunk's categorical columns get the narrowest dictionary indices for the
+    categories it happens to have, or no value type when it has none at all.
+    """
+    import pyarrow as pa
+
+    fields = []
+    for field in schema:
+        if pa.types.is_dictionary(field.type):
+            value_type = pa.string() if pa.types.is_null(field.type.value_type) else field.type.value_type
+            field = field.with_type(pa.dictionary(pa.int32(), value_type, ordered=field.type.ordered))
+        fields.append(field)
+
+    return pa.schema(fields, metadata=schema.metadata)
+
+def stream_statement(path, iter_chunks, account_type, part_path, categories_file, llm_model, metrics, timing, chunk_rows=CHUNK_ROWS):
+    """
+    Extract, categorise and write a statement one chunk at a time.
+
+    The categorised chunks are appended to a Parquet file at ``part_path``. The
+    extraction cache, which holds whole statements, is not used.
+
+    Returns:
+        str: ``part_path``, or None if the statement has no transactions.
+    """
+    chunks = iter_chunks(path, chunk_rows)
+    with TransactionWriter(part_path) as writer:
+        while True:
+            start = time.perf_counter()
+            with metrics.timer("extract_csv"):
+                transactions = next(chunks, None)
+            timing["extract_s"] += time.perf_counter() - start
+            if transactions is None:
+                break
+
+            metrics.increment("csv_chunks")
+            metrics.increment("rows_extracted", len(transactions))
+            transactions["Account Type"] = account_type
+            to_canonical(transactions)
+
+            start = time.perf_counter()
+            categorized_df, _, _ = categorize_transactions(
+                transactions, account_type, categories_file=categories_file, llm_model=llm_model, metrics=metrics
+            )
+            timing["categorize_s"] += time.perf_counter() - start
+
+            categorized_df.insert(0, "Source File", path)
+            writer.write(categorized_df)
+            timing["rows"] = writer.rows
+
+    return part_path if writer.rows else None
+
+def find_statements(inputs):
+    """
+    Expand directories and glob patterns into a sorted list of statement files.
+
+    Args:
+        inputs (list): Files, directories or glob patterns.
+
+    Returns:
+        list: Paths of PDF and CSV files.
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = glob.glob(os.path.join(item, "**", "*"), recursive=True)
+        else:
+            candidates = glob.glob(item, recursive=True)
+
+        paths.update(
+            path for path in candidates
+            if os.path.isfile(path) and os.path.splitext(path)[1].lower() in STATEMENT_EXTENSIONS
+        )
+
+    return sorted(paths)
+
+def resolve_account_type(path, mappings, statement_format=None):
+    """
+    Return the account type for a file from the first matching "pattern=type" mapping,
+    falling back to the default account type of its detected format.
+
+    Args:
+        path (str): Path to the statement.
+        mappings (list): (glob pattern, account type) pairs, matched against the path and the file name.
+        statement_format (str): Detected format of the file, a key of STATEMENT_FORMATS.
+
+    Returns:
+        str: The account type, or None if nothing decides it.
+    """
+    for pattern, account_type in mappings:
+        if fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(os.path.basename(path), pattern):
+            return account_type
+
+    if statement_format is None:
+        return None
+    return STATEMENT_FORMATS[statement_format]["account_type"]
+
+def process_statement(path, mappings, categories_file, llm_model, cache_dir=None, part_path=None, chunk_rows=CHUNK_ROWS):
+    """
+    Detect the format of one statement, then extract and categorise it.
+
+    Extractions are reused from the cache in ``cache_dir`` when it is given. When
+    ``part_path`` is given and the format can be parsed in chunks, the statement is
+    streamed into a Parquet file there instead of being returned.
+
+    Returns:
+        tuple: (categorised DataFrame, path of the Parquet file holding it, or None;
+                timing dict with a "metrics" snapshot)
+    """
+    timing = {"file": path, "account_type": "", "rows": 0, "extract_s": 0.0, "categorize_s": 0.0, "error": ""}
+    metrics = Metrics()
+    timing["metrics"] = metrics.as_dict()
+
+    try:
+        start = time.perf_counter()
+        with metrics.timer("detect_format"):
+            statement_format = detect_format(path)
+        account_type = resolve_account_type(path, mappings, statement_format)
+        timing["account_type"] = account_type or ""
+
+        if statement_format is None:
+            # A file the sniffers do not recognise is parsed as the format its mapped account type uses
+            candidates = formats_for_account_type(account_type)
+            if not candidates:
+                raise ValueError("Unrecognised statement format")
+            statement_format = candidates[0]
+
+        iter_chunks = STATEMENT_FORMATS[statement_format]["iter_chunks"]
+        if part_path and iter_chunks:
+            timing["extract_s"] = time.perf_counter() - start
+            part = stream_statement(
+                path, iter_chunks, account_type, part_path, categories_file, llm_model, metrics, timing, chunk_rows
+            )
+            timing["metrics"] = metrics.as_dict()
+            return part, timing
+
+        extractor = STATEMENT_FORMATS[statement_format]["extractor"]
+        cache = ExtractionCache(cache_dir) if cache_dir else None
+        # Files are already spread over the pool, so each PDF's pages are extracted serially
+        transactions = extract_with_cache(extractor, path, cache, metrics=metrics, debug=False)
+        timing["extract_s"] = time.perf_counter() - start
+        timing["metrics"] = metrics.as_dict()
+
+        if transactions is None or transactions.empty:
+            return None, timing
+
+        transactions["Account Type"] = account_type
+        to_canonical(transactions)
+
+        start = time.perf_counter()
+        categorized_df, _, stats = categorize_transactions(
+            transactions, account_type, categories_file=categories_file, llm_model=llm_model, metrics=metrics
+        )
+        timing["categorize_s"] = time.perf_counter() - start
+        timing["metrics"] = stats["metrics"]
+        timing["rows"] = len(categorized_df)
+
+        categorized_df.insert(0, "Source File", path)
+        return categorized_df, timing
+    except Exception as e:
+        timing["error"] = str(e)
+        return None, timing
+
+def write_output(results, output_path):
+    """
+    Write each file's transactions, in order, to one Parquet or CSV file.
+
+    Args:
+        results (list): Categorised DataFrames, or paths of Parquet files written by
+                        stream_statement, which are copied a row group at a time.
+        output_path (str): Output .parquet or .csv file.
+
+    Returns:
+        int: Number of transactions written.
+    """
+    with TransactionWriter(output_path) as writer:
+        for result in results:
+            if isinstance(result, pd.DataFrame):
+                writer.write(result)
+                continue
+
+            import pyarrow.parquet as pq
+
+            part = pq.ParquetFile(result)
+            for row_group in range(part.num_row_groups):
+                writer.write(part.read_row_group(row_group).to_pandas())
+
+    return writer.rows
+
+def print_summary(timings, wall_time):
+    """Print per-file timings and overall throughput."""
+    print(f"{'file':<50} {'type':>4} {'rows':>8} {'extract s':>10} {'categorize s':>13} {'rows/s':>10}")
+    for timing in timings:
+        elapsed = timing["extract_s"] + timing["categorize_s"]
+        rate = timing["rows"] / elapsed if elapsed > 0 else 0
+        line = (
+            f"{timing['file'][-50:]:<50} {timing['account_type']:>4} {timing['rows']:>8} "
+            f"{timing['extract_s']:>10.2f} {timing['categorize_s']:>13.2f} {rate:>10.0f}"
+        )
+        if timing["error"]:
+            line += f"  ERROR: {timing['error']}"
+        print(line)
+
+    total_rows = sum(timing["rows"] for timing in timings)
+    failed = sum(1 for timing in timings if timing["error"])
+    print(
+        f"\n{len(timings)} files ({failed} failed), {total_rows} transactions in {wall_time:.2f}s "
+        f"({total_rows / wall_time if wall_time > 0 else 0:.0f} rows/s)"
+    )
+
+def parse_args(argv=None):
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Extract and categorise bank statements in bulk.")
+    parser.add_argument("inputs", nargs="+", help="Statement files, directories or glob patterns")
+    parser.add_argument(
+        "--map", action="append", default=[], metavar="PATTERN=TYPE",
+        help="Account type for files matching a glob pattern, e.g. '*joint*.csv=D' (first match wins, overrides the detected format's)"
+    )
+    parser.add_argument("-o", "--output", default="transactions.parquet", help="Output .parquet or .csv file")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    parser.add_argument("--categories", default="categories.json", help="Path to categories JSON file")
+    parser.add_argument("--model", default="gemma3", help="Name of the LLM model to use")
+    parser.add_argument("--cache-dir", default=".extraction_cache", help="Extraction cache directory")
+    parser.add_argument("--no-cache", action="store_true", help="Always extract, without reading or writing the cache")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows categorised at once when a statement is streamed")
+    parser.add_argument("--log-file", default="finance_tracker.log", help="Log file path")
+    parser.add_argument(
+        "--log-verbosity", choices=VERBOSITY_LEVELS, default="summary",
+        help="Log one line per pass, per matched pattern, or per transaction"
+    )
+    parser.add_argument("--metrics", metavar="PATH", help="Write combined metrics to a Prometheus text-format file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Run the batch and return the process exit code."""
+    args = parse_args(argv)
+    configure_logging(args.log_file, verbosity=args.log_verbosity)
+
+    mappings = []
+    for mapping in args.map:
+        pattern, separator, account_type = mapping.rpartition("=")
+        if not separator or not pattern:
+            sys.exit(f"Invalid --map value '{mapping}', expected PATTERN=TYPE")
+        mappings.append((pattern, account_type))
+
+    paths = find_statements(args.inputs)
+    if not paths:
+        sys.exit("No PDF or CSV statements found.")
+
+    # Streamed statements go to Parquet part files, which needs pyarrow
+    part_dir = None
+    if importlib.util.find_spec("pyarrow") is not None:
+        part_dir = tempfile.TemporaryDirectory(prefix="batch_parts_", dir=os.path.dirname(os.path.abspath(args.output)))
+
+    start = time.perf_counter()
+    results, timings = {}, []
+    with ProcessPoolExecutor(
+        max_workers=max(1, min(args.workers, len(paths))),
+        # Forked workers inherit the logging setup; this covers platforms that spawn them
+        initializer=configure_logging, initargs=(args.log_file, args.log_verbosity),
+    ) as executor:
+        futures = [
+            executor.submit(
+                process_statement, path, mappings, args.categories, args.model,
+                None if args.no_cache else args.cache_dir,
+                os.path.join(part_dir.name, f"{index}.parquet") if part_dir else None, args.chunk_rows
+            )
+            for index, path in enumerate(paths)
+        ]
+        for future in as_completed(futures):
+            result, timing = future.result()
+            timings.append(timing)
+            if result is not None:
+                results[timing["file"]] = result
+    wall_time = time.perf_counter() - start
+
+    timings.sort(key=lambda timing: timing["file"])
+    print_summary(timings, wall_time)
+
+    try:
+        if results:
+            rows = write_output([results[path] for path in sorted(results)], args.output)
+            print(f"Wrote {rows} transactions to {args.output}")
+    finally:
+        if part_dir:
+            part_dir.cleanup()
+
+    if args.metrics:
+        metrics = Metrics()
+        for timing in timings:
+            metrics.merge(timing["metrics"])
+        write_prometheus(metrics.as_dict(), args.metrics)
+        print(f"Wrote metrics to {args.metrics}")
+
+    return 1 if any(timing["error"] for timing in timings) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Local fake Ollama server with configurable latency, for benchmarks and tests.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# "  12. description" lines of a batch prompt
+BATCH_LINE = re.compile(r"^\s*(\d+)\. (.*)$", re.MULTILINE)
+
+class FakeOllamaServer:
+    """
+    Answers Ollama /api/generate requests after a fixed delay.
+
+    Batch prompts get a JSON object with one category per numbered transaction,
+    single prompts get a bare category. Use as a context manager; ``url`` is
+    what OLLAMA_HOST should point at.
+
+    Args:
+        latency (float): Seconds to wait before answering each request.
+        category (str or callable): The category answered, or a function from a
+                                    transaction description to its category.
+        omit (set): Transaction numbers, as strings, left out of batch answers.
+        fail_first (int): Number of initial requests answered with HTTP 500.
+    """
+
+    def __init__(self, latency=0.05, category="Shopping", omit=(), fail_first=0):
+        self.latency = latency
+        self.category = category
+        self.omit = set(omit)
+        self.fail_first = fail_first
+        self.requests = 0
+        self.prompts = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with fake._lock:
+                    fake.requests += 1
+                    fake.prompts.append(body.get("prompt", ""))
+                    failing = fake.requests <= fake.fail_first
+                time.sleep(fake.latency)
+
+                if failing:
+                    self.send_response(500)
+                    self.send_header("Content-Type", "application/json")
+                    self.end_headers()
+                    self.wfile.write(json.dumps({"error": "fake failure"}).encode())
+                    return
+
+                lines = BATCH_LINE.findall(body.get("prompt", ""))
+                if lines:
+                    response = json.dumps({
+                        number: fake.answer(text) for number, text in lines if number not in fake.omit
+                    })
+                else:
+                    response = fake.answer("")
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                for chunk, done in ((response, False), ("", True)):
+                    message = {"model": body.get("model", ""), "created_at": "2024-01-01T00:00:00Z", "response": chunk, "done": done}
+                    if done:
+                        message["done_reason"] = "stop"
+                    self.wfile.write((json.dumps(message) + "\n").encode())
+
+        return Handler
+
+    def answer(self, text):
+        """Return the category answered for one transaction description."""
+        return self.category(text) if callable(self.category) else self.category
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
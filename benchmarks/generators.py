@@ -0,0 +1,194 @@
+"""
+Synthetic statement and rules generators for the benchmark suite.
+"""
+import json
+import random
+import pandas as pd
+
+MONTH_ABBREVIATIONS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+CATEGORY_NAMES = [
+    "Groceries", "Transportation", "Dining Out", "Entertainment", "Shopping",
+    "Health", "Travel", "Subscriptions", "Utilities", "Housing"
+]
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+def random_word(rng, low=4, high=9):
+    """Return a random lowercase word."""
+    return "".join(rng.choice(LETTERS) for _ in range(rng.randint(low, high)))
+
+def make_merchants(count, seed=0):
+    """Return ``count`` distinct two-word merchant names."""
+    rng = random.Random(seed)
+    merchants = set()
+    while len(merchants) < count:
+        merchants.add(f"{random_word(rng)} {random_word(rng)}")
+    return sorted(merchants)
+
+def write_categories(path, learned_patterns=1000, category_patterns=20, seed=0):
+    """
+    Write a categories.json with a configurable number of patterns.
+
+    Args:
+        path (str): Output path.
+        learned_patterns (int): Number of learned merchant patterns.
+        category_patterns (int): Number of predefined patterns per category.
+        seed (int): Random seed.
+
+    Returns:
+        dict: The categories written, so generators can draw descriptions that match them.
+    """
+    rng = random.Random(seed)
+    merchants = make_merchants(learned_patterns, seed)
+    categories = {
+        "account_terms": {
+            "A": {"payment thank you": "Transfers", "interest charge": "Miscellaneous"},
+            "C": {"top-up": "Transfers"},
+        },
+        "learned_patterns": {merchant: rng.choice(CATEGORY_NAMES) for merchant in merchants},
+        "categories": {
+            category: [random_word(rng, 5, 10) for _ in range(category_patterns)]
+            for category in CATEGORY_NAMES
+        },
+    }
+
+    with open(path, "w") as f:
+        json.dump(categories, f, indent=2)
+
+    return categories
+
+def make_descriptions(count, categories=None, unknown_ratio=0.1, unknown_merchants=200, seed=0):
+    """
+    Return transaction descriptions drawn from the given rules.
+
+    ``unknown_ratio`` of them use merchants that no rule matches, so they reach the LLM pass.
+    """
+    rng = random.Random(seed)
+    known = []
+    if categories:
+        known.extend(f"card payment to {merchant} on {rng.randint(1, 28)} jan" for merchant in categories["learned_patterns"])
+        for patterns in categories["categories"].values():
+            known.extend(f"{pattern.upper()} {rng.randint(100, 9999)}" for pattern in patterns)
+        known.extend(categories["account_terms"].get("A", {}))
+    unknown = [f"{random_word(rng).upper()} {random_word(rng).upper()} {rng.randint(100, 9999)}" for _ in range(unknown_merchants)]
+
+    return [
+        rng.choice(unknown) if not known or rng.random() < unknown_ratio else rng.choice(known)
+        for _ in range(count)
+    ]
+
+def _pdf_text(text):
+    """Escape text for a PDF string literal in WinAnsi encoding."""
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("cp1252", "replace")
+
+def write_barclays_pdf(path, pages=10, rows_per_column=40, descriptions=None, seed=0, statement_date=None):
+    """
+    Write a two-column Barclays-style statement that extract_transactions_from_pdf can parse.
+
+    The first page is a summary, every other page holds ``rows_per_column`` transactions
+    in each half, in the "DD Mon DESCRIPTION £1,234.56[CR]" layout the extractor expects.
+    The PDF is written directly with a standard Helvetica font, so no PDF library is needed.
+
+    Args:
+        path (str): Output path.
+        pages (int): Number of pages, including the summary page.
+        rows_per_column (int): Transactions per column on each transaction page.
+        descriptions (list): Descriptions to draw from; random words if omitted.
+        seed (int): Random seed.
+        statement_date (str): Printed as "Statement date ..." on the summary page, if given.
+
+    Returns:
+        int: Number of transactions written.
+    """
+    rng = random.Random(seed)
+    descriptions = descriptions or make_descriptions(200, seed=seed)
+    width, height = 595, 842
+    line_height = (height - 80) / max(rows_per_column, 1)
+
+    streams = []
+    transactions = 0
+    for page_number in range(pages):
+        lines = [(40, height - 30, f"Page {page_number + 1}")]
+        if page_number == 0:
+            lines.append((40, height - 60, "Your previous balance £1,234.56"))
+            if statement_date:
+                lines.append((40, height - 75, f"Statement date {statement_date}"))
+        else:
+            lines.append((40, height - 45, "Your transactions"))
+            for x in (20, width / 2 + 10):
+                for row in range(rows_per_column):
+                    amount = f"£{rng.randint(1, 2500):,}.{rng.randint(0, 99):02d}"
+                    if rng.random() < 0.05:
+                        amount += "CR"
+                    text = f"{rng.randint(1, 28)} {rng.choice(MONTH_ABBREVIATIONS)} {rng.choice(descriptions)[:30]} {amount}"
+                    lines.append((x, height - 60 - row * line_height, text))
+                    transactions += 1
+
+        content = b"".join(
+            b"BT /F1 6 Tf %.2f %.2f Td (" % (x, y) + _pdf_text(text) + b") Tj ET\n"
+            for x, y, text in lines
+        )
+        streams.append(content)
+
+    # Objects: 1 catalog, 2 page tree, 3 font, then a page and a content stream per page
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % (4 + 2 * i) for i in range(pages)) + b"] /Count %d >>" % pages,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    for i, content in enumerate(streams):
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (width, height, 5 + 2 * i)
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"endstream")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    with open(path, "wb") as f:
+        f.write(output)
+
+    return transactions
+
+def write_revolut_csv(path, rows=10000, descriptions=None, seed=0):
+    """
+    Write a Revolut-style CSV export.
+
+    Args:
+        path (str): Output path.
+        rows (int): Number of transactions.
+        descriptions (list): Descriptions to draw from; random words if omitted.
+        seed (int): Random seed.
+
+    Returns:
+        int: Number of transactions written.
+    """
+    rng = random.Random(seed)
+    descriptions = descriptions or make_descriptions(200, seed=seed)
+    start = pd.Timestamp("2023-01-01")
+    completed = [start + pd.Timedelta(seconds=rng.randint(0, 2 * 365 * 86400)) for _ in range(rows)]
+
+    pd.DataFrame({
+        "Type": "CARD_PAYMENT",
+        "Product": "Current",
+        "Started Date": completed,
+        "Completed Date": completed,
+        "Description": [rng.choice(descriptions) for _ in range(rows)],
+        "Amount": [round(rng.uniform(-250, 100), 2) for _ in range(rows)],
+        "Fee": 0.0,
+        "Currency": "GBP",
+        "State": "COMPLETED",
+        "Balance": 0.0,
+    }).to_csv(path, index=False)
+
+    return rows
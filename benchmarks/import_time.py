@@ -0,0 +1,114 @@
+"""
+Benchmark how long the app's modules take to import in a fresh interpreter.
+
+Each module is imported in a new process, so nothing is already cached, and the
+best of several runs is reported. Heavy dependencies that should only load on
+first use are checked too: the run fails if importing a module pulls one in.
+
+Example:
+    python -m benchmarks.import_time --save-baseline benchmarks/import_baseline.json
+    python -m benchmarks.import_time --compare benchmarks/import_baseline.json --tolerance 0.3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules whose cold import is measured
+MODULES = [
+    "utils.transaction_extractor",
+    "utils.categoriser",
+    "utils.extraction_cache",
+    "utils.warehouse",
+    "batch_process",
+]
+
+# Dependencies that must not be loaded just by importing the modules above
+DEFERRED_MODULES = ["langchain_ollama", "langchain_core", "pdfplumber", "pdfminer"]
+
+# Run in the child process: time the import and report which deferred modules it loaded
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {deferred!r} if name in sys.modules]}}))
+"""
+
+def measure_import(module, repeat=5):
+    """
+    Import a module in fresh interpreters and return the fastest import time.
+
+    Args:
+        module (str): Module to import.
+        repeat (int): Number of fresh interpreters; the fastest import is kept.
+
+    Returns:
+        dict: seconds and the deferred modules the import loaded.
+    """
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    best = None
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, deferred=DEFERRED_MODULES)],
+            cwd=repo, capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        if best is None or result["seconds"] < best["seconds"]:
+            best = result
+
+    return {"seconds": round(best["seconds"], 4), "loaded": best["loaded"]}
+
+def compare(results, baseline, tolerance):
+    """Return a message for every module that imports more than ``tolerance`` slower than the baseline."""
+    failures = []
+    for module, result in results.items():
+        if module in baseline and result["seconds"] > baseline[module]["seconds"] * (1 + tolerance) + 0.01:
+            failures.append(f"{module}: {result['seconds']:.3f}s vs baseline {baseline[module]['seconds']:.3f}s")
+    return failures
+
+def parse_args(argv=None):
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark cold import times.")
+    parser.add_argument("--modules", nargs="+", default=MODULES, help="Modules to import")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module; the fastest is reported")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Save the results as a baseline JSON file")
+    parser.add_argument("--compare", metavar="PATH", help="Compare against a baseline and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed relative regression")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Run the import benchmark and return the process exit code."""
+    args = parse_args(argv)
+    results = {module: measure_import(module, args.repeat) for module in args.modules}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    print(f"{'module':<32} {'seconds':>9}")
+    failures = []
+    for module, result in results.items():
+        line = f"{module:<32} {result['seconds']:>9.3f}"
+        if baseline and module in baseline and baseline[module]["seconds"]:
+            line += f"  {result['seconds'] / baseline[module]['seconds'] - 1:+.0%} vs baseline"
+        print(line)
+        if result["loaded"]:
+            failures.append(f"{module}: imports {', '.join(result['loaded'])} eagerly")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"params": vars(args), "results": results}, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if baseline:
+        failures += compare(results, baseline, args.tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
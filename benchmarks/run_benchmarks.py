@@ -0,0 +1,178 @@
+"""
+Benchmark extraction and categorisation on synthetic statements.
+
+Reports rows/s and peak traced memory per scenario, can save the results as a
+baseline, and fails when a run is slower or uses more memory than the baseline
+beyond a tolerance.
+
+Example:
+    python -m benchmarks.run_benchmarks --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --compare benchmarks/baseline.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from loguru import logger
+from benchmarks.fake_llm import FakeOllamaServer
+from benchmarks.generators import make_descriptions, write_barclays_pdf, write_categories, write_revolut_csv
+from utils.categoriser import categorize_transactions
+from utils.matcher import CategoryMatcher, LoweredText
+from utils.transaction_extractor import extract_transactions_from_csv, extract_transactions_from_pdf
+
+def measure(function, rows, repeat=1):
+    """
+    Run a function and return its best rows/s and peak traced memory.
+
+    Args:
+        function (callable): Work to measure, called with no arguments.
+        rows (int): Rows processed by one call.
+        repeat (int): Number of runs; the fastest one is kept.
+
+    Returns:
+        dict: rows, seconds, rows_per_s and peak_mb.
+    """
+    best_seconds, peak = float("inf"), 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        best_seconds = min(best_seconds, seconds)
+
+    return {
+        "rows": rows,
+        "seconds": round(best_seconds, 4),
+        "rows_per_s": round(rows / best_seconds, 1) if best_seconds > 0 else float("inf"),
+        "peak_mb": round(peak / 2**20, 2),
+    }
+
+def run_benchmarks(args, workdir):
+    """Generate the synthetic inputs and run every scenario."""
+    categories_file = os.path.join(workdir, "categories.json")
+    categories = write_categories(categories_file, args.learned_patterns, args.category_patterns)
+    descriptions = make_descriptions(args.rows, categories, unknown_ratio=0.0)
+    llm_descriptions = make_descriptions(args.llm_rows, categories, unknown_ratio=args.unknown_ratio, unknown_merchants=args.unknown_merchants)
+
+    pdf_path = os.path.join(workdir, "statement.pdf")
+    pdf_rows = write_barclays_pdf(pdf_path, args.pages, 40, descriptions[:1000])
+    csv_path = os.path.join(workdir, "revolut.csv")
+    write_revolut_csv(csv_path, args.rows, descriptions)
+
+    results = {}
+    results["extract_pdf"] = measure(lambda: extract_transactions_from_pdf(pdf_path), pdf_rows)
+    results["extract_pdf_parallel"] = measure(lambda: extract_transactions_from_pdf(pdf_path, workers=None), pdf_rows)
+    results["extract_csv"] = measure(lambda: extract_transactions_from_csv(csv_path), args.rows, args.repeat)
+
+    frame = pd.DataFrame({"Details": descriptions})
+    matcher = CategoryMatcher(categories)
+    text = LoweredText(frame["Details"])
+    uncategorized = np.ones(len(frame), dtype=bool)
+    results["lowercase_details"] = measure(lambda: LoweredText(frame["Details"]), args.rows, args.repeat)
+    results["pass1_account_terms"] = measure(lambda: matcher.match_account_terms(text, "A", uncategorized), args.rows, args.repeat)
+    results["pass2_learned_patterns"] = measure(lambda: matcher.match_learned_patterns(text), args.rows, args.repeat)
+    results["pass3_categories"] = measure(lambda: matcher.match_categories(text), args.rows, args.repeat)
+
+    results["categorize_patterns"] = measure(
+        lambda: categorize_transactions(
+            pd.DataFrame({"Details": descriptions}), "A", categories_file, cache_file=None, store_file=None
+        ),
+        args.rows, args.repeat,
+    )
+
+    with FakeOllamaServer(latency=args.llm_latency) as server:
+        os.environ["OLLAMA_HOST"] = server.url
+        results["pass4_llm"] = measure(
+            lambda: categorize_transactions(
+                pd.DataFrame({"Details": llm_descriptions}), "A", categories_file,
+                llm_model=args.model, cache_file=None, store_file=None
+            ),
+            args.llm_rows,
+        )
+        results["pass4_llm"]["llm_requests"] = server.requests
+
+    return results
+
+def compare(results, baseline, tolerance):
+    """
+    Return a message for every scenario that regressed against the baseline.
+
+    A scenario regresses when its rows/s drops, or its peak memory grows, by more than ``tolerance``.
+    """
+    failures = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        if result["rows_per_s"] < expected["rows_per_s"] * (1 - tolerance):
+            failures.append(f"{name}: {result['rows_per_s']} rows/s vs baseline {expected['rows_per_s']}")
+        if result["peak_mb"] > expected["peak_mb"] * (1 + tolerance) + 1:
+            failures.append(f"{name}: peak {result['peak_mb']} MB vs baseline {expected['peak_mb']} MB")
+    return failures
+
+def print_results(results, baseline=None):
+    """Print one line per scenario, with the change against the baseline when given."""
+    print(f"{'scenario':<24} {'rows':>8} {'seconds':>9} {'rows/s':>12} {'peak MB':>9}")
+    for name, result in results.items():
+        line = f"{name:<24} {result['rows']:>8} {result['seconds']:>9.3f} {result['rows_per_s']:>12.1f} {result['peak_mb']:>9.2f}"
+        if baseline and name in baseline and baseline[name]["rows_per_s"]:
+            change = result["rows_per_s"] / baseline[name]["rows_per_s"] - 1
+            line += f"  {change:+.0%} vs baseline"
+        print(line)
+
+def parse_args(argv=None):
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark extraction and categorisation.")
+    parser.add_argument("--rows", type=int, default=50000, help="Rows for CSV and pattern scenarios")
+    parser.add_argument("--pages", type=int, default=20, help="Pages in the synthetic PDF statement")
+    parser.add_argument("--learned-patterns", type=int, default=5000, help="Learned patterns in categories.json")
+    parser.add_argument("--category-patterns", type=int, default=30, help="Predefined patterns per category")
+    parser.add_argument("--llm-rows", type=int, default=2000, help="Rows for the LLM scenario")
+    parser.add_argument("--unknown-ratio", type=float, default=0.2, help="Share of LLM scenario rows no pattern matches")
+    parser.add_argument("--unknown-merchants", type=int, default=200, help="Distinct merchants among those rows")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake LLM latency per request, in seconds")
+    parser.add_argument("--model", default="benchmark", help="Model name sent to the fake LLM")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario; the fastest is reported")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Save the results as a baseline JSON file")
+    parser.add_argument("--compare", metavar="PATH", help="Compare against a baseline and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Run the benchmarks and return the process exit code."""
+    args = parse_args(argv)
+    # Benchmark the work itself, not the log file
+    logger.remove()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run_benchmarks(args, workdir)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"params": vars(args), "results": results}, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if baseline:
+        failures = compare(results, baseline, args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        return 1 if failures else 0
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
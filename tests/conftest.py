@@ -0,0 +1,35 @@
+import json
+import pytest
+from benchmarks.fake_llm import FakeOllamaServer
+from utils.categoriser import get_llm
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """
+    Start a fake Ollama server and point the LLM client at it.
+
+    Returns a function taking FakeOllamaServer's arguments; every server it starts
+    is stopped after the test.
+    """
+    servers = []
+
+    def start(**kwargs):
+        server = FakeOllamaServer(latency=kwargs.pop("latency", 0), **kwargs).start()
+        servers.append(server)
+        monkeypatch.setenv("OLLAMA_HOST", server.url)
+        # Clients are cached per model, so drop the one bound to the previous host
+        get_llm.cache_clear()
+        return server
+
+    yield start
+
+    get_llm.cache_clear()
+    for server in servers:
+        server.stop()
+
+@pytest.fixture
+def categories_file(tmp_path):
+    """Write a categories file with no patterns, so every transaction reaches the LLM pass."""
+    path = tmp_path / "categories.json"
+    path.write_text(json.dumps({"account_terms": {}, "learned_patterns": {}, "categories": {}}))
+    return str(path)
@@ -0,0 +1,27 @@
+import pandas as pd
+import pyarrow.parquet as pq
+from batch_process import main, process_statement
+from benchmarks.generators import write_revolut_csv
+
+def test_csv_statements_are_streamed_in_chunks(fake_llm, categories_file, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fake_llm(category=lambda text: "Groceries" if text < "m" else "Shopping")
+    write_revolut_csv("revolut.csv", rows=250)
+    whole, _ = process_statement("revolut.csv", [], categories_file, "test")
+
+    for output in ("streamed.parquet", "streamed.csv"):
+        exit_code = main([
+            "revolut.csv", "-o", output, "--categories", categories_file, "--model", "test",
+            "--chunk-rows", "100", "--no-cache", "--workers", "1", "--log-file", "batch.log",
+        ])
+        assert exit_code == 0
+
+        if output.endswith(".parquet"):
+            assert pq.ParquetFile(output).num_row_groups == 3
+            streamed = pd.read_parquet(output)
+        else:
+            streamed = pd.read_csv(output)
+
+        assert len(streamed) == len(whole) == 250
+        for column in ("Source File", "Details", "Amount", "Debit/Credit", "Category"):
+            assert streamed[column].astype(str).tolist() == whole[column].astype(str).tolist()
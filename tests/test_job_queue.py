@@ -0,0 +1,52 @@
+import threading
+from utils.job_queue import JobQueue
+
+def wait(job):
+    while not job.done:
+        threading.Event().wait(0.01)
+    return job
+
+def test_jobs_report_progress_and_results():
+    queue = JobQueue(max_workers=1)
+
+    def work(job, value):
+        job.update("Halfway", 0.5)
+        return value * 2
+
+    job = wait(queue.submit("double", work, 21, key="double"))
+
+    assert job.status == "done"
+    assert job.result == 42
+    assert [stage for _, stage, _ in job.events] == ["Halfway", "Done"]
+    assert job.progress == 1.0
+
+def test_failed_work_is_kept_until_forgotten():
+    queue = JobQueue(max_workers=1)
+    calls = []
+
+    def flaky(job):
+        calls.append(job.id)
+        if len(calls) == 1:
+            raise RuntimeError("first attempt fails")
+        return "ok"
+
+    assert queue.find("flaky") is None
+    failed = wait(queue.submit("flaky", flaky, key="flaky"))
+    assert failed.status == "failed" and failed.error == "first attempt fails"
+    assert queue.find("flaky") is failed
+    assert queue.submit("flaky", flaky, key="flaky") is failed
+
+    assert queue.forget("flaky")
+    assert queue.find("flaky") is None
+    retried = wait(queue.submit("flaky", flaky, key="flaky"))
+    assert retried.result == "ok"
+    assert queue.find("flaky") is retried
+    assert queue.submit("flaky", flaky, key="flaky") is retried
+    assert len(calls) == 2
+
+def test_only_the_latest_finished_jobs_are_kept():
+    queue = JobQueue(max_workers=1, max_finished=2)
+    jobs = [wait(queue.submit(str(number), lambda job, number=number: number, key=number)) for number in range(4)]
+
+    assert [job.name for job in queue.jobs()] == ["2", "3"]
+    assert queue.find(0) is None and queue.find(3) is jobs[3]
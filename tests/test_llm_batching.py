@@ -0,0 +1,55 @@
+import pandas as pd
+from utils.categoriser import categorize_batch_with_llm, categorize_transactions
+from utils.metrics import Metrics
+
+def by_keyword(text):
+    """Answer Groceries for Tesco and Travel for everything else."""
+    return "Groceries" if "TESCO" in text else "Travel"
+
+def test_batch_answer_is_parsed_per_transaction(fake_llm):
+    server = fake_llm(category=by_keyword)
+
+    categories = categorize_batch_with_llm(["TESCO STORES 123", "BA FLIGHT 456", "TESCO EXPRESS"], "A", "test")
+
+    assert categories == ["Groceries", "Travel", "Groceries"]
+    assert server.requests == 1
+
+def test_missing_key_falls_back_for_that_transaction_only(fake_llm):
+    fake_llm(category=by_keyword, omit={"2"})
+
+    assert categorize_batch_with_llm(["TESCO STORES", "BA FLIGHT"], "A", "test") == ["Groceries", "Miscellaneous"]
+    assert categorize_batch_with_llm(["TESCO STORES", "BA FLIGHT"], "A", "test", fallback=None) == ["Groceries", None]
+
+def test_failed_request_is_retried(fake_llm):
+    server = fake_llm(category=by_keyword, fail_first=1)
+    metrics = Metrics()
+
+    categories = categorize_batch_with_llm(["TESCO STORES"], "A", "test", retries=2, metrics=metrics)
+
+    assert categories == ["Groceries"]
+    assert server.requests == 2
+    assert metrics.as_dict()["counters"]["llm_failures"] == 1
+
+def test_timed_out_requests_fall_back_after_retries(fake_llm):
+    server = fake_llm(category=by_keyword, latency=1.0)
+
+    categories = categorize_batch_with_llm(["TESCO STORES"], "A", "test", timeout=0.2, retries=1, fallback=None)
+
+    assert categories == [None]
+    assert server.requests == 2
+
+def test_each_merchant_reaches_the_llm_once(fake_llm, categories_file):
+    server = fake_llm(category=by_keyword)
+    df = pd.DataFrame({
+        "Details": ["TESCO STORES on 1 jan", "BA FLIGHT", "TESCO STORES on 2 jan", "BA FLIGHT", "TESCO STORES on 3 jan"],
+        "Amount": [1.0, 2.0, 3.0, 4.0, 5.0],
+    })
+
+    categorized, _, stats = categorize_transactions(
+        df, "A", categories_file, llm_model="test", cache_file=None, store_file=None,
+        llm_batch_size=1, similarity_threshold=None
+    )
+
+    assert server.requests == 2
+    assert stats["llm_calls"] == 2
+    assert categorized["Category"].tolist() == ["Groceries", "Travel", "Groceries", "Travel", "Groceries"]
@@ -0,0 +1,136 @@
+import random
+import re
+import numpy as np
+import pandas as pd
+from utils.categoriser import apply_matches
+from utils.matcher import CategoryMatcher, LoweredText
+
+def categorise_one_pattern_at_a_time(df, categories, account_type):
+    """Passes 1 to 3 as categorize_transactions applied them before the matcher, one pattern at a time."""
+    df = df.copy()
+    uncategorized_mask = df['Category'].isna()
+
+    if account_type in categories["account_terms"]:
+        for term, category in categories["account_terms"][account_type].items():
+            term_mask = df['Details'].str.strip().str.lower() == term.lower()
+            df.loc[term_mask, 'Category'] = category
+            contains_mask = df['Details'].str.lower().str.contains(term, na=False) & uncategorized_mask
+            df.loc[contains_mask, 'Category'] = category
+        uncategorized_mask = df['Category'].isna()
+
+    for merchant, category in categories["learned_patterns"].items():
+        merchant_mask = df['Details'].str.lower().str.contains(merchant, na=False) & uncategorized_mask
+        df.loc[merchant_mask, 'Category'] = category
+    uncategorized_mask = df['Category'].isna()
+
+    for category, patterns in categories["categories"].items():
+        if not patterns:
+            continue
+        pattern_str = '|'.join(re.escape(pattern.lower()) for pattern in patterns)
+        pattern_mask = df['Details'].str.lower().str.contains(pattern_str, na=False, regex=True) & uncategorized_mask
+        df.loc[pattern_mask, 'Category'] = category
+        uncategorized_mask = df['Category'].isna()
+
+    return df['Category'].tolist()
+
+def categorise_with_matcher(df, categories, account_type):
+    """Passes 1 to 3 as run_category_passes applies them with a CategoryMatcher."""
+    df = df.copy()
+    matcher = CategoryMatcher(categories)
+    text = LoweredText(df['Details'])
+    uncategorized_mask = df['Category'].isna()
+
+    if account_type in categories["account_terms"]:
+        winners = matcher.match_account_terms(text, account_type, uncategorized_mask.to_numpy())
+        apply_matches(df, winners, matcher.account_terms[account_type][0], "")
+        uncategorized_mask = df['Category'].isna()
+
+    winners = matcher.match_learned_patterns(text)
+    winners[~uncategorized_mask.to_numpy()] = -1
+    apply_matches(df, winners, matcher.learned_patterns, "")
+    uncategorized_mask = df['Category'].isna()
+
+    winners = matcher.match_categories(text)
+    winners[~uncategorized_mask.to_numpy()] = -1
+    apply_matches(df, winners, matcher.categories, "")
+
+    return df['Category'].tolist()
+
+def random_pattern(rng):
+    """A short pattern over a tiny alphabet, so patterns overlap and prefix each other."""
+    pattern = "".join(rng.choice("abc ") for _ in range(rng.randint(1, 3)))
+    shape = rng.random()
+    if shape < 0.1:
+        return pattern.upper()
+    if shape < 0.15:
+        return pattern[:1] + "." + pattern[1:]
+    if shape < 0.2:
+        return "^" + pattern
+    if shape < 0.25:
+        return pattern + "$"
+    if shape < 0.3:
+        return pattern + "|" + random_pattern(rng)
+    if shape < 0.35:
+        return "[ab]" + pattern
+    return pattern
+
+def random_case(rng):
+    terms = {random_pattern(rng): f"term{i}" for i in range(rng.randint(0, 6))}
+    categories = {
+        "account_terms": {"A": terms},
+        "learned_patterns": {random_pattern(rng): f"learned{i}" for i in range(rng.randint(0, 6))},
+        "categories": {f"category{i}": [random_pattern(rng) for _ in range(rng.randint(0, 3))] for i in range(rng.randint(0, 5))},
+    }
+
+    details = []
+    for _ in range(rng.randint(1, 30)):
+        kind = rng.random()
+        if kind < 0.1:
+            details.append(np.nan)
+        elif kind < 0.25 and terms:
+            # Exact account term matches ignore case and surrounding spaces
+            details.append(f" {rng.choice(list(terms)).swapcase()} ")
+        else:
+            details.append("".join(rng.choice("abcAB .|[]^$") for _ in range(rng.randint(0, 8))))
+
+    # Some rows arrive categorised, e.g. from the transaction store
+    existing = [rng.choice([None, None, "Stored"]) for _ in details]
+    return pd.DataFrame({"Details": details, "Category": pd.Series(existing, dtype=object)}), categories
+
+def test_matcher_agrees_with_one_pattern_at_a_time_on_random_rules():
+    rng = random.Random(0)
+    for _ in range(200):
+        df, categories = random_case(rng)
+        for account_type in ("A", "B"):
+            assert categorise_with_matcher(df, categories, account_type) == categorise_one_pattern_at_a_time(df, categories, account_type), (df, categories)
+
+def test_precedence_of_each_pass():
+    categories = {
+        "account_terms": {"A": {"tesco": "Groceries", "tesco petrol": "Transportation", "SHELL": "Transportation"}},
+        "learned_patterns": {"amazon": "Shopping", "amazon prime": "Entertainment", "a.b": "Regex"},
+        "categories": {"Food": ["pret", "cafe"], "Coffee": ["caf", "pret a"], "Dots": ["x.y"]},
+    }
+    df = pd.DataFrame({
+        "Details": [" TESCO ", "tesco petrol station", "shell", "amazon prime video", "axb", "pret a manger", "x.y", "xzy", np.nan],
+        "Category": pd.Series([None, None, None, None, None, None, None, None, None], dtype=object),
+    })
+    df.loc[0, "Category"] = "Stored"
+
+    expected = [
+        # An exact account term overrides a category the row already had
+        "Groceries",
+        # Later account terms and learned patterns win
+        "Transportation",
+        # Account terms are matched as written, so upper case ones only match exactly
+        "Transportation",
+        "Entertainment",
+        # Learned patterns keep their regex meaning, category patterns do not
+        "Regex",
+        # The first category with a match wins
+        "Food",
+        "Dots",
+        None,
+        None,
+    ]
+    assert categorise_one_pattern_at_a_time(df, categories, "A") == expected
+    assert categorise_with_matcher(df, categories, "A") == expected
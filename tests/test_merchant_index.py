@@ -0,0 +1,40 @@
+import threading
+from benchmarks.generators import make_merchants
+from utils.merchant_index import MerchantIndex
+
+def test_nearest_finds_the_closest_merchant():
+    index = MerchantIndex()
+    index.add([("tesco stores", "Groceries"), ("shell garage", "Transportation")])
+
+    categories, scores = index.nearest(["tesco store 123", "zzzz"])
+
+    assert categories == ["Groceries", None]
+    assert 0.5 < scores[0] <= 1.0
+    assert scores[1] == 0
+
+def test_concurrent_adds_and_lookups():
+    merchants = make_merchants(3000)
+    index = MerchantIndex()
+    index.add((merchant, "Shopping") for merchant in merchants[:500])
+    errors = []
+
+    def add():
+        for start in range(500, len(merchants), 50):
+            index.add((merchant, "Travel") for merchant in merchants[start:start + 50])
+
+    def look_up():
+        try:
+            for _ in range(30):
+                categories, _ = index.nearest(merchants[:200])
+                assert None not in categories
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=add)] + [threading.Thread(target=look_up) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(index) == len(merchants)
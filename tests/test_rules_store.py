@@ -0,0 +1,50 @@
+import json
+from utils.rules_store import RulesStore
+
+def write_rules(tmp_path, learned_patterns=None):
+    path = tmp_path / "categories.json"
+    path.write_text(json.dumps({"account_terms": {}, "learned_patterns": learned_patterns or {}, "categories": {}}))
+    return str(path)
+
+def test_added_patterns_are_loaded(tmp_path):
+    store = RulesStore(write_rules(tmp_path, {"tesco": "Groceries"}))
+
+    store.add_patterns([("netflix", "Entertainment"), ("tesco", "Shopping")])
+
+    assert store.load()["learned_patterns"] == {"tesco": "Shopping", "netflix": "Entertainment"}
+    assert RulesStore(store.categories_file).load() == store.load()
+
+def test_loaded_rules_never_change(tmp_path):
+    store = RulesStore(write_rules(tmp_path, {"tesco": "Groceries"}))
+    store.add_patterns([("shell", "Transportation")])
+    snapshot = store.load()
+    learned = dict(snapshot["learned_patterns"])
+
+    store.add_patterns([("netflix", "Entertainment")])
+
+    assert snapshot["learned_patterns"] == learned
+    assert store.load()["learned_patterns"]["netflix"] == "Entertainment"
+
+def test_compaction_folds_the_journal_into_the_file(tmp_path):
+    store = RulesStore(write_rules(tmp_path), compact_after=2)
+
+    store.add_patterns([("tesco", "Groceries"), ("netflix", "Entertainment")])
+
+    with open(store.categories_file) as f:
+        assert json.load(f)["learned_patterns"] == {"tesco": "Groceries", "netflix": "Entertainment"}
+    assert not (tmp_path / "categories.json.journal").exists()
+
+def test_rules_hash_is_only_recomputed_when_the_files_change(tmp_path, monkeypatch):
+    store = RulesStore(write_rules(tmp_path))
+    first = store.rules_hash()
+
+    def locked(lock_file):
+        raise AssertionError("unchanged rules were read again")
+
+    monkeypatch.setattr("utils.rules_store.file_lock", locked)
+    assert store.rules_hash() == first
+
+    monkeypatch.undo()
+    store.add_patterns([("tesco", "Groceries")])
+    assert store.rules_hash() not in ("", first)
+    assert store.rules_hash() == RulesStore(store.categories_file).rules_hash()
@@ -0,0 +1,69 @@
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.generators import write_barclays_pdf, write_revolut_csv
+from utils.extraction_cache import ExtractionCache, extract_with_cache
+from utils.transaction_extractor import (
+    extract_transactions_from_csv, extract_transactions_from_pdf, infer_statement_dates, iter_transactions_from_csv,
+    parse_statement_date,
+)
+
+def test_statement_date_is_read_from_the_summary_page():
+    assert parse_statement_date("Statement date 14 March 2024\nPayment due 8 Apr 2024") == pd.Timestamp("2024-03-14")
+    assert parse_statement_date("Opened 1 Jan 2020. Payment due 8 Apr 2024") == pd.Timestamp("2024-04-08")
+    assert parse_statement_date("Statement period 15 Nov 2024 to 14 December 2024") == pd.Timestamp("2024-12-14")
+    assert parse_statement_date("Your previous balance £1,234.56") is None
+
+def test_unlabelled_dates_are_not_taken_for_the_statement_date():
+    # A promotional rate ending after the statement would move transactions a year forward
+    assert parse_statement_date("14 December 2024\nYour 0% rate ends 1 March 2026") is None
+    assert parse_statement_date("Rate ends 1 March 2026\nPayment due 8 January 2025") == pd.Timestamp("2025-01-08")
+
+def test_years_are_inferred_from_the_statement_date():
+    dates = infer_statement_dates(pd.Series([20, 5]), pd.Series([12, 1]), "2023-01-10")
+
+    assert dates.tolist() == [pd.Timestamp("2022-12-20"), pd.Timestamp("2023-01-05")]
+
+def test_pdf_transactions_are_dated_by_the_printed_statement_date(tmp_path):
+    path = str(tmp_path / "statement.pdf")
+    write_barclays_pdf(path, pages=2, rows_per_column=10, statement_date="31 December 2019")
+
+    df = extract_transactions_from_pdf(path, workers=1)
+
+    assert df.attrs["statement_date"] == "2019-12-31"
+    assert set(df["Date"].dt.year) == {2019}
+
+def test_pages_extracted_in_parallel_from_a_thread_match_serial_extraction(tmp_path):
+    path = str(tmp_path / "statement.pdf")
+    write_barclays_pdf(path, pages=10, rows_per_column=5, statement_date="14 March 2024")
+    with open(path, "rb") as f:
+        contents = f.read()
+
+    # As in the app, where a job queue thread opts in to page workers
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        parallel = executor.submit(extract_transactions_from_pdf, contents, workers=2).result()
+
+    pd.testing.assert_frame_equal(parallel, extract_transactions_from_pdf(path))
+
+def test_undated_statements_are_cached_for_the_day_only(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache"))
+    dated, undated = str(tmp_path / "dated.pdf"), str(tmp_path / "undated.pdf")
+    write_barclays_pdf(dated, pages=2, rows_per_column=5, statement_date="31 December 2019")
+    write_barclays_pdf(undated, pages=2, rows_per_column=5, seed=1)
+
+    for path in (dated, undated):
+        extract_with_cache(extract_transactions_from_pdf, path, cache, workers=1)
+        assert extract_with_cache(extract_transactions_from_pdf, path, cache, workers=1) is not None
+
+    today_suffix = f"-{pd.Timestamp.today().date().isoformat()}.parquet"
+    assert cache.hits == 2
+    assert sorted(path.endswith(today_suffix) for path, _, _ in cache.entries()) == [False, True]
+
+def test_csv_chunks_join_into_the_whole_statement(tmp_path):
+    path = str(tmp_path / "revolut.csv")
+    write_revolut_csv(path, rows=250)
+
+    chunks = list(iter_transactions_from_csv(path, chunksize=100))
+    whole = extract_transactions_from_csv(path)
+
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+    pd.testing.assert_frame_equal(pd.concat(chunks), whole)
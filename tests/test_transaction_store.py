@@ -0,0 +1,46 @@
+import socket
+import pandas as pd
+from utils.categoriser import categorize_transactions, get_llm
+
+def statement():
+    return pd.DataFrame({
+        "Date": pd.to_datetime(["2024-01-02", "2024-01-03"]),
+        "Details": ["NETFLIX.COM", "BA FLIGHT"],
+        "Amount": [10.99, 250.0],
+        "Debit/Credit": ["Debit", "Debit"],
+    })
+
+def unused_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def test_unchanged_transactions_are_reused(fake_llm, categories_file, tmp_path):
+    server = fake_llm(category="Entertainment")
+    store_file = str(tmp_path / "transactions.db")
+
+    categorize_transactions(statement(), "A", categories_file, llm_model="test", cache_file=None, store_file=store_file)
+    _, _, stats = categorize_transactions(statement(), "A", categories_file, llm_model="test", cache_file=None, store_file=store_file)
+
+    assert stats["reused_count"] == 2
+    assert server.requests == 1
+
+def test_fallback_categories_are_not_stored(fake_llm, categories_file, tmp_path, monkeypatch):
+    store_file = str(tmp_path / "transactions.db")
+    monkeypatch.setenv("OLLAMA_HOST", f"http://127.0.0.1:{unused_port()}")
+    get_llm.cache_clear()
+
+    offline, _, _ = categorize_transactions(
+        statement(), "A", categories_file, llm_model="test", cache_file=None, store_file=store_file
+    )
+    assert offline["Category"].tolist() == ["Miscellaneous", "Miscellaneous"]
+
+    # Once the LLM is back, the rows that fell back are asked again
+    server = fake_llm(category="Entertainment")
+    online, _, stats = categorize_transactions(
+        statement(), "A", categories_file, llm_model="test", cache_file=None, store_file=store_file
+    )
+
+    assert stats["reused_count"] == 0
+    assert server.requests == 1
+    assert online["Category"].tolist() == ["Entertainment", "Entertainment"]
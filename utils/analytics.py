@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+from utils.categoriser import extract_merchant
+
+# Typical days between payments of a recurring charge, with the gap accepted around it
+CADENCES = {
+    "Weekly": (7, 1),
+    "Monthly": (30.4, 4),
+    "Quarterly": (91.3, 7),
+    "Yearly": (365.25, 14),
+}
+
+def monthly_totals(transactions):
+    """
+    Total categorised transactions per month, account type and category.
+
+    Gives the same table as TransactionWarehouse.monthly_summary, for transactions
+    that are not in the warehouse, such as the output of categorize_transactions.
+
+    Args:
+        transactions (pd.DataFrame): Transactions with 'Date', 'Amount', 'Debit/Credit'
+                                     and 'Category' columns
+
+    Returns:
+        pd.DataFrame: 'Period', 'Account Type', 'Category', 'Debit', 'Credit' and 'Count' columns
+    """
+    dated = transactions[transactions["Date"].notna()]
+    amount = dated["Amount"].to_numpy()
+    is_debit = (dated["Debit/Credit"] == "Debit").to_numpy()
+    account_type = dated["Account Type"] if "Account Type" in dated.columns else pd.Series("", index=dated.index)
+
+    totals = pd.DataFrame({
+        "Period": dated["Date"].dt.to_period("M"),
+        "Account Type": account_type.astype(object),
+        "Category": dated["Category"].astype(object),
+        "Debit": np.where(is_debit, amount, 0.0),
+        "Credit": np.where(is_debit, 0.0, amount),
+    }).groupby(["Period", "Account Type", "Category"], dropna=False, observed=True).agg(
+        Debit=("Debit", "sum"), Credit=("Credit", "sum"), Count=("Debit", "size")
+    )
+
+    return totals.reset_index()
+
+def spending_by_month(monthly):
+    """
+    Turn monthly totals into a month × category table of net spending.
+
+    Net spending is debits minus credits, so refunds reduce it. Months with no
+    transactions are included as zeros, so rolling windows cover calendar months.
+
+    Args:
+        monthly (pd.DataFrame): Output of monthly_totals or TransactionWarehouse.monthly_summary
+
+    Returns:
+        pd.DataFrame: One row per month (PeriodIndex), one column per category
+    """
+    if monthly.empty:
+        return pd.DataFrame(index=pd.PeriodIndex([], freq="M"))
+
+    spending = monthly.assign(
+        Net=monthly["Debit"] - monthly["Credit"],
+        Category=monthly["Category"].astype(object).fillna("Uncategorized"),
+    ).pivot_table(index="Period", columns="Category", values="Net", aggfunc="sum", fill_value=0.0)
+
+    months = pd.period_range(spending.index.min(), spending.index.max(), freq="M")
+    return spending.reindex(months, fill_value=0.0).rename_axis(index="Period", columns="Category")
+
+def rolling_average(spending, window=3):
+    """
+    Average each category's spending over the last ``window`` months.
+
+    Args:
+        spending (pd.DataFrame): Output of spending_by_month
+        window (int): Number of months averaged
+
+    Returns:
+        pd.DataFrame: Same shape as ``spending``; early months average what is available
+    """
+    return spending.rolling(window, min_periods=1).mean()
+
+def budget_vs_actual(spending, budgets):
+    """
+    Compare each month's spending with a monthly budget per category.
+
+    Args:
+        spending (pd.DataFrame): Output of spending_by_month
+        budgets (dict): Category → monthly budget; categories without one are left out
+
+    Returns:
+        pd.DataFrame: 'Period', 'Category', 'Budget', 'Actual', 'Remaining', 'Used' (fraction
+                      of the budget spent) and 'Over Budget' columns
+    """
+    budget = pd.Series(budgets, dtype="float64")
+    actual = spending.reindex(columns=budget.index, fill_value=0.0)
+
+    comparison = actual.stack().rename("Actual").reset_index()
+    comparison.columns = ["Period", "Category", "Actual"]
+    comparison["Budget"] = budget.reindex(comparison["Category"]).to_numpy()
+    comparison["Remaining"] = comparison["Budget"] - comparison["Actual"]
+    comparison["Used"] = comparison["Actual"] / comparison["Budget"].replace(0, np.nan)
+    comparison["Over Budget"] = comparison["Actual"] > comparison["Budget"]
+
+    return comparison[["Period", "Category", "Budget", "Actual", "Remaining", "Used", "Over Budget"]]
+
+def detect_recurring(transactions, min_occurrences=3, amount_tolerance=0.1):
+    """
+    Find subscriptions and other charges that recur at a regular interval.
+
+    A merchant is recurring when it was debited at least ``min_occurrences`` times,
+    the median gap between payments matches one of CADENCES, most gaps fall within
+    that cadence's tolerance, and the amounts stay within ``amount_tolerance`` of
+    their median.
+
+    Args:
+        transactions (pd.DataFrame): Transactions with 'Date', 'Details', 'Amount' and
+                                     'Debit/Credit' columns, and optionally 'Merchant'
+                                     (as stored in the warehouse) and 'Category'
+        min_occurrences (int): Fewest payments that count as recurring
+        amount_tolerance (float): Largest relative deviation from the median amount
+
+    Returns:
+        pd.DataFrame: One row per recurring merchant with 'Merchant', 'Category', 'Cadence',
+                      'Amount', 'Occurrences', 'Last Payment' and 'Next Expected' columns,
+                      largest yearly cost first
+    """
+    columns = ["Merchant", "Category", "Cadence", "Amount", "Occurrences", "Last Payment", "Next Expected"]
+    debits = transactions[(transactions["Debit/Credit"] == "Debit") & transactions["Date"].notna()]
+    if debits.empty:
+        return pd.DataFrame(columns=columns)
+
+    if "Merchant" in debits.columns:
+        merchants = debits["Merchant"].astype(object)
+    else:
+        # Merchant extraction runs once per distinct description
+        details = debits["Details"].astype(object)
+        unique_details = details.dropna().unique()
+        merchants = details.map(dict(zip(unique_details, map(extract_merchant, unique_details))))
+
+    payments = pd.DataFrame({
+        "Merchant": merchants.to_numpy(),
+        "Category": debits["Category"].astype(object).to_numpy() if "Category" in debits.columns else None,
+        "Date": debits["Date"].to_numpy(),
+        "Amount": debits["Amount"].to_numpy(),
+    }).dropna(subset=["Merchant"])
+    payments = payments[payments["Merchant"] != ""].sort_values(["Merchant", "Date"], kind="stable")
+
+    payments["Gap"] = payments.groupby("Merchant")["Date"].diff().dt.days
+    merchant_stats = payments.groupby("Merchant").agg(
+        Category=("Category", "last"),
+        Occurrences=("Date", "size"),
+        Amount=("Amount", "median"),
+        Gap=("Gap", "median"),
+        Last_Payment=("Date", "max"),
+    )
+    deviation = (payments["Amount"] - payments["Merchant"].map(merchant_stats["Amount"])).abs()
+    merchant_stats["Amount_Deviation"] = (deviation / payments["Merchant"].map(merchant_stats["Amount"])).groupby(payments["Merchant"]).max()
+
+    # Match each merchant's median gap against every cadence at once
+    cadence_names = list(CADENCES)
+    days = np.array([days for days, _ in CADENCES.values()])
+    slack = np.array([slack for _, slack in CADENCES.values()])
+    matches = np.abs(merchant_stats["Gap"].to_numpy()[:, None] - days[None, :]) <= slack[None, :]
+    cadence_index = np.where(matches.any(axis=1), matches.argmax(axis=1), -1)
+    merchant_stats["Cadence"] = [cadence_names[index] if index >= 0 else None for index in cadence_index]
+    merchant_stats["Cadence_Days"] = np.where(cadence_index >= 0, days[np.maximum(cadence_index, 0)], np.nan)
+    merchant_stats["Cadence_Slack"] = np.where(cadence_index >= 0, slack[np.maximum(cadence_index, 0)], np.nan)
+
+    # Most individual gaps, not just the median, have to fit the cadence
+    gap_fits = (
+        (payments["Gap"] - payments["Merchant"].map(merchant_stats["Cadence_Days"])).abs()
+        <= payments["Merchant"].map(merchant_stats["Cadence_Slack"])
+    )
+    merchant_stats["Regularity"] = gap_fits.groupby(payments["Merchant"]).sum() / (merchant_stats["Occurrences"] - 1)
+
+    recurring = merchant_stats[
+        (merchant_stats["Occurrences"] >= min_occurrences)
+        & merchant_stats["Cadence"].notna()
+        & (merchant_stats["Regularity"] >= 0.75)
+        & (merchant_stats["Amount_Deviation"] <= amount_tolerance)
+    ].copy()
+
+    recurring["Next Expected"] = recurring["Last_Payment"] + pd.to_timedelta(recurring["Cadence_Days"].round(), unit="D")
+    recurring["Yearly Cost"] = recurring["Amount"] * 365.25 / recurring["Cadence_Days"]
+    recurring = recurring.sort_values("Yearly Cost", ascending=False).reset_index()
+
+    return recurring.rename(columns={"Last_Payment": "Last Payment"})[columns]
@@ -1,33 +1,137 @@
 # improved_categorizer.py
 import json
-import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
 import pandas as pd
-import re
-from langchain_ollama import OllamaLLM
 from loguru import logger
-
-# Configure Loguru
-logger.remove()  # Remove the default handler
-logger.add("finance_tracker.log", rotation="10 MB", level="INFO")  # Add a file handler
+from utils.llm_cache import LLMCache
+from utils.logging_config import log_enabled
+from utils.matcher import CategoryMatcher, LoweredText
+from utils.merchant_index import MerchantIndex
+from utils.metrics import Metrics
+from utils.rules_store import get_rules_store
+from utils.schema import to_canonical
+from utils.transaction_store import TransactionStore, transaction_fingerprints
 
 def load_categories(file_path="categories.json"):
-    """Load category mappings from JSON file."""
-    if os.path.exists(file_path):
-        with open(file_path, "r") as f:
-            return json.load(f)
+    """
+    Load category mappings from JSON file.
 
-def categorize_with_llm(text, account_type, llm_model="llama2"):
-    """Use LLM to categorize a transaction."""
-    llm = OllamaLLM(model=llm_model)
-    
-    account_context = ""
-    if account_type == "Barclays Credit Card":
-        account_context = "Note: For credit cards, 'payment' usually means paying the credit card bill."
-    elif account_type == "Revolut":
-        account_context = "Note: For Revolut, 'payment' usually refers to a purchase."
-    
-    prompt = f"""
-    Categorize this transaction into ONE of these categories:
+    The rules are parsed once per process and re-read only when the file or its journal
+    of approved patterns changes (see utils.rules_store). The result is shared, so it
+    must not be modified.
+    """
+    return get_rules_store(file_path).load()
+
+# Compiled matcher for the most recently loaded categories file, as a (key, matcher) entry
+_matcher_cache = {}
+# Guards both caches, which concurrent categorisations share
+_cache_lock = threading.Lock()
+
+def get_matcher(categories, categories_file="categories.json"):
+    """
+    Return the compiled matcher for a categories file, rebuilding it only when the file changes.
+
+    Args:
+        categories (dict): Categories already loaded from the file
+        categories_file (str): Path to categories JSON file
+
+    Returns:
+        CategoryMatcher: Matcher for all substring passes
+    """
+    key = categories_file_key(categories_file)
+    with _cache_lock:
+        entry = _matcher_cache.get("entry")
+        if key is None or entry is None or entry[0] != key:
+            entry = (key, CategoryMatcher(categories))
+            _matcher_cache["entry"] = entry
+
+    return entry[1]
+
+def categories_file_key(categories_file):
+    """Return what identifies the current version of a categories file, or None if it cannot be read."""
+    version = get_rules_store(categories_file).version()
+    return version if version[1] is not None else None
+
+# Nearest-neighbour index of categorised merchants for the most recently loaded categories file,
+# as a (key, index) entry
+_merchant_index_cache = {}
+
+def get_merchant_index(categories, categories_file="categories.json"):
+    """
+    Return the merchant index for a categories file, rebuilding it only when the file changes.
+
+    The index starts with the learned patterns; merchants the LLM categorises and patterns
+    saved through save_approved_patterns are added to it as they come.
+
+    Args:
+        categories (dict): Categories already loaded from the file
+        categories_file (str): Path to categories JSON file
+
+    Returns:
+        MerchantIndex: Index of categorised merchants
+    """
+    key = categories_file_key(categories_file)
+    with _cache_lock:
+        entry = _merchant_index_cache.get("entry")
+        if key is None or entry is None or entry[0] != key:
+            index = MerchantIndex()
+            index.add(categories["learned_patterns"].items())
+            entry = (key, index)
+            _merchant_index_cache["entry"] = entry
+
+    return entry[1]
+
+def apply_matches(df, winners, patterns, message):
+    """
+    Assign each row the category of its winning pattern.
+
+    Matches are logged per pattern, and per row, only when the log verbosity asks for it.
+
+    Args:
+        df (pd.DataFrame): DataFrame with transactions
+        winners (np.ndarray): Position of the winning pattern per row, or -1
+        patterns (list): (pattern, category) pairs the positions refer to
+        message (str): Log template with {pattern}, {category} and {count} fields, formatted only when logged
+
+    Returns:
+        int: Number of rows categorized
+    """
+    matched = np.flatnonzero(winners >= 0)
+    if len(matched) == 0:
+        return 0
+
+    if log_enabled("pattern"):
+        log_matches(df, matched, winners, patterns, message)
+
+    labels = np.array([category for _, category in patterns], dtype=object)
+    df.iloc[matched, df.columns.get_loc('Category')] = labels[winners[matched]].tolist()
+
+    return len(matched)
+
+def log_matches(df, matched, winners, patterns, message):
+    """Log one line per matched pattern and, at "row" verbosity, one line per matched transaction."""
+    log_rows = log_enabled("row")
+    matched = matched[np.argsort(winners[matched], kind="stable")]
+    positions, first_rows, counts = np.unique(winners[matched], return_index=True, return_counts=True)
+    if log_rows:
+        index = df.index.to_numpy()
+        details = df['Details'].to_numpy()
+
+    for position, first, count in zip(positions, first_rows, counts):
+        pattern, category = patterns[position]
+        logger.info(message, pattern=pattern, category=category, count=count)
+        if log_rows:
+            for row in np.sort(matched[first:first + count]):
+                logger.info("    Transaction {}: '{}' → '{}'", index[row], details[row], category)
+
+# Bump whenever the prompt below changes so cached LLM answers are not reused
+PROMPT_VERSION = "2"
+
+PROMPT_CATEGORIES = """
     - Rent
     - Home Utilities
     - Groceries
@@ -43,28 +147,155 @@ def categorize_with_llm(text, account_type, llm_model="llama2"):
     - Subscriptions
     - Income
     - Transfers
-    - Miscellaneous
+    - Miscellaneous"""
+
+VALID_CATEGORIES = [
+    "Housing", "Utilities", "Groceries", "Transportation", 
+    "Dining Out", "Entertainment", "Shopping", "Health",
+    "Travel", "Subscriptions", "Income", "Transfers", "Miscellaneous"
+]
+
+@lru_cache(maxsize=None)
+def get_llm(llm_model, timeout=60, json_format=False):
+    """
+    Return a long-lived LLM client, shared across calls and threads.
+
+    Args:
+        llm_model (str): Name of the LLM model to use
+        timeout (float): Seconds to wait for a response before giving up
+        json_format (bool): Ask the model to answer with JSON
+
+    Returns:
+        OllamaLLM: The shared client
+    """
+    # langchain takes most of a second to import, so it is only loaded once a row reaches the LLM
+    from langchain_ollama import OllamaLLM
+
+    return OllamaLLM(
+        model=llm_model,
+        format="json" if json_format else "",
+        client_kwargs={"timeout": timeout},
+    )
+
+def get_account_context(account_type):
+    """Return the account-specific hint added to categorisation prompts."""
+    if account_type == "Barclays Credit Card":
+        return "Note: For credit cards, 'payment' usually means paying the credit card bill."
+    elif account_type == "Revolut":
+        return "Note: For Revolut, 'payment' usually refers to a purchase."
+    return ""
+
+def parse_category(response):
+    """Map a free-text LLM answer onto one of the valid categories."""
+    for category in VALID_CATEGORIES:
+        if category.lower() in response.lower():
+            return category
+    
+    return "Miscellaneous"
+
+def categorize_with_llm(text, account_type, llm_model="llama2"):
+    """Use LLM to categorize a transaction."""
+    llm = get_llm(llm_model)
+    
+    prompt = f"""
+    Categorize this transaction into ONE of these categories:{PROMPT_CATEGORIES}
 
     Transaction: {text}
     Account type: {account_type}
-    {account_context}
+    {get_account_context(account_type)}
 
     Category:
     """
     
     response = llm.invoke(prompt).strip()
 
-    valid_categories = [
-        "Housing", "Utilities", "Groceries", "Transportation", 
-        "Dining Out", "Entertainment", "Shopping", "Health",
-        "Travel", "Subscriptions", "Income", "Transfers", "Miscellaneous"
-    ]
-    
-    for category in valid_categories:
-        if category.lower() in response.lower():
-            return category
+    return parse_category(response)
+
+def categorize_batch_with_llm(texts, account_type, llm_model="llama2", timeout=60, retries=2, fallback="Miscellaneous", metrics=None):
+    """
+    Use LLM to categorize several transactions with a single prompt.
+
+    The model is asked for a JSON object mapping each transaction number to its
+    category. Failed or unparseable requests are retried; any transaction still
+    without an answer gets the fallback category.
+
+    Args:
+        texts (list): Transaction descriptions
+        account_type (str): The type of account
+        llm_model (str): Name of the LLM model to use
+        timeout (float): Seconds to wait for each request
+        retries (int): Extra attempts after a failed request
+        fallback (str): Category for transactions the LLM gave no answer for
+        metrics (Metrics): Where request latencies and failures are recorded
+
+    Returns:
+        list: One category per description, in the same order
+    """
+    metrics = metrics or Metrics()
+    llm = get_llm(llm_model, timeout, json_format=True)
     
-    return "Miscellaneous"
+    transactions = "\n".join(f"    {number}. {text}" for number, text in enumerate(texts, start=1))
+    prompt = f"""
+    Categorize each of these transactions into ONE of these categories:{PROMPT_CATEGORIES}
+
+    Transactions:
+{transactions}
+    Account type: {account_type}
+    {get_account_context(account_type)}
+
+    Answer with a JSON object mapping each transaction number to its category,
+    for example {{"1": "Groceries", "2": "Travel"}}.
+    """
+
+    answers = {}
+    for attempt in range(retries + 1):
+        metrics.increment("llm_requests")
+        request_start = time.perf_counter()
+        try:
+            answers = json.loads(llm.invoke(prompt))
+            if isinstance(answers, dict):
+                break
+            logger.warning(f"LLM batch answer was not a JSON object (attempt {attempt + 1})")
+        except Exception as e:
+            logger.warning(f"LLM batch request failed (attempt {attempt + 1}): {e}")
+        finally:
+            metrics.observe("llm_latency", time.perf_counter() - request_start)
+        metrics.increment("llm_failures")
+        answers = {}
+
+    return [
+        parse_category(str(answers[str(number)])) if str(number) in answers else fallback
+        for number in range(1, len(texts) + 1)
+    ]
+
+def categorize_many_with_llm(texts, account_type, llm_model="llama2", batch_size=20, max_workers=4, timeout=60, retries=2, fallback="Miscellaneous", metrics=None):
+    """
+    Categorize many transactions in concurrent batches through one shared client.
+
+    Args:
+        texts (list): Transaction descriptions
+        account_type (str): The type of account
+        llm_model (str): Name of the LLM model to use
+        batch_size (int): Number of transactions per prompt
+        max_workers (int): Number of batches in flight at once
+        timeout (float): Seconds to wait for each request
+        retries (int): Extra attempts after a failed request
+        fallback (str): Category for transactions the LLM gave no answer for
+        metrics (Metrics): Where request latencies and failures are recorded
+
+    Returns:
+        list: One category per description, in the same order
+    """
+    batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    if not batches:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+        results = executor.map(
+            lambda batch: categorize_batch_with_llm(batch, account_type, llm_model, timeout, retries, fallback, metrics),
+            batches,
+        )
+        return [category for batch in results for category in batch]
 
 def extract_merchant(text):
     """Extract merchant name from transaction description."""
@@ -79,140 +310,327 @@ def extract_merchant(text):
 
     return text.split(" on ")[0].split(" ref ")[0].strip()
 
-def save_approved_patterns(approved_patterns, categories_file="categories.json"):
+def save_approved_patterns(approved_patterns, categories_file="categories.json", store_file="transactions.db"):
     """
     Save only approved patterns to the categories file.
+
+    The patterns are appended to the rules journal under a file lock, so concurrent
+    approvals never overwrite each other. Stored transactions the new patterns could recategorise are dropped from the
+    transaction store, the rest stay valid for the updated rules.
     
     Args:
         approved_patterns (list): List of (merchant, category) tuples to approve
         categories_file (str): Path to categories JSON file
+        store_file (str): Path to the transaction store, or None if it is not used
     """
 
-    with open(categories_file, "r") as f:
-        categories = json.load(f)
-    
-    for merchant, category in approved_patterns:
-        categories["learned_patterns"][merchant] = category
+    rules_store = get_rules_store(categories_file)
+    previous_key = categories_file_key(categories_file)
+    rules_store.add_patterns(approved_patterns)
+    categories = rules_store.load()
+
+    # Update the merchant index in place rather than rebuilding it for the changed rules
+    with _cache_lock:
+        entry = _merchant_index_cache.get("entry")
+        if previous_key is not None and entry is not None and entry[0] == previous_key:
+            entry[1].add(approved_patterns)
+            _merchant_index_cache["entry"] = (categories_file_key(categories_file), entry[1])
 
-    with open(categories_file, "w") as f:
-        json.dump(categories, f, indent=2)
+    if store_file:
+        store = TransactionStore(store_file)
+        try:
+            dropped = store.invalidate_matching([merchant for merchant, _ in approved_patterns])
+            store.set_rules_hash(rules_store.rules_hash())
+            logger.info(f"Dropped {dropped} stored transactions affected by the approved patterns")
+        finally:
+            store.close()
     
     return categories
 
-def categorize_transactions(df, account_type, categories_file="categories.json", llm_model="gemma3"):
+# Stages reported to categorize_transactions' progress callback, in order
+PASS_NAMES = ("store_lookup", "pass1_account_terms", "pass2_learned_patterns", "pass3_categories", "pass4_llm")
+
+def run_category_passes(df, account_type, categories, categories_file="categories.json", llm_model="gemma3", cache_file="llm_cache.db", llm_batch_size=20, llm_workers=4, metrics=None, similarity_threshold=0.8, progress=None):
     """
-    Categorize all transactions in a dataframe.
+    Run the four categorisation passes over the uncategorised rows of a dataframe.
     
     Args:
-        df (pd.DataFrame): DataFrame with transactions
+        df (pd.DataFrame): DataFrame with transactions and an object 'Category' column
         account_type (str): The type of account
+        categories (dict): Category mappings loaded from the categories file
         categories_file (str): Path to categories JSON file
         llm_model (str): Name of the LLM model to use
+        cache_file (str): Path to the LLM categorisation cache, or None to disable it
+        llm_batch_size (int): Number of transactions sent to the LLM per prompt
+        llm_workers (int): Number of LLM batches in flight at once
+        metrics (Metrics): Where pass timings and counters are recorded
+        similarity_threshold (float): Cosine similarity from which a merchant takes the category of
+                                      its nearest categorised merchant instead of asking the LLM,
+                                      or None to always ask the LLM
+        progress (callable): Called as progress(stage, uncategorized) after each pass, where
+                             stage is one of PASS_NAMES and uncategorized the rows still left
         
     Returns:
-        tuple: (DataFrame with categories, list of new category mappings)
+        tuple: (list of new category mappings, boolean array of rows categorised by the LLM,
+                boolean array of rows given the fallback category because the LLM did not answer,
+                LLM stats dict)
     """
-    categories = load_categories(categories_file)
-    
-    if 'Category' not in df.columns:
-        df['Category'] = None
-
+    metrics = metrics or Metrics()
+    progress = progress or (lambda stage, uncategorized: None)
     new_patterns = []
 
+    with metrics.timer("matcher_build"):
+        matcher = get_matcher(categories, categories_file)
+    with metrics.timer("lowercase_details"):
+        text = LoweredText(df['Details'])
     uncategorized_mask = df['Category'].isna()
    
     logger.info("PASS 1: Checking account-specific terms")
+    pass_start = time.perf_counter()
 
     if account_type in categories["account_terms"]:
-        for term, category in categories["account_terms"][account_type].items():
-            term_mask = df['Details'].str.strip().str.lower() == term.lower()
-
-            matches = term_mask.sum()
-
-            if matches > 0:
-                logger.info(f"  Exact match: '{term}' → '{category}', {matches} transactions")
-                for idx in df[term_mask].index:
-                    logger.info(f"    Transaction {idx}: '{df.at[idx, 'Details']}' → '{category}'")
-                df.loc[term_mask, 'Category'] = category
-
-            contains_mask = df['Details'].str.lower().str.contains(term, na=False) & uncategorized_mask
-            matches = contains_mask.sum()
-            if matches > 0:
-                logger.info(f"  Partial match: '{term}' → '{category}', {matches} transactions")
-                for idx in df[contains_mask].index:
-                    logger.info(f"    Transaction {idx}: '{df.at[idx, 'Details']}' → '{category}'")
-                df.loc[contains_mask, 'Category'] = category
+        winners = matcher.match_account_terms(text, account_type, uncategorized_mask.to_numpy())
+        apply_matches(
+            df, winners, matcher.account_terms[account_type][0],
+            "  Account term match: '{pattern}' → '{category}', {count} transactions"
+        )
         
         uncategorized_mask = df['Category'].isna()
         logger.info(f"After account-specific terms: {uncategorized_mask.sum()} uncategorized")
+    metrics.add_time("pass1_account_terms", time.perf_counter() - pass_start)
+    progress("pass1_account_terms", int(uncategorized_mask.sum()))
     
     logger.info("PASS 2: Checking learned patterns")
+    pass_start = time.perf_counter()
     learned_patterns_count = 0
     if categories["learned_patterns"]:
-        for merchant, category in categories["learned_patterns"].items():
-            merchant_mask = df['Details'].str.lower().str.contains(merchant, na=False) & uncategorized_mask
-            matches = merchant_mask.sum()
-            if matches > 0:
-                logger.info(f"  Learned pattern match: '{merchant}' → '{category}', {matches} transactions")
-                for idx in df[merchant_mask].index:
-                    logger.info(f"    Transaction {idx}: '{df.at[idx, 'Details']}' → '{category}'")
-                df.loc[merchant_mask, 'Category'] = category
-                learned_patterns_count += matches
+        winners = matcher.match_learned_patterns(text)
+        winners[~uncategorized_mask.to_numpy()] = -1
+        learned_patterns_count = apply_matches(
+            df, winners, matcher.learned_patterns,
+            "  Learned pattern match: '{pattern}' → '{category}', {count} transactions"
+        )
         
         uncategorized_mask = df['Category'].isna()
         logger.info(f"After learned patterns: {uncategorized_mask.sum()} uncategorized, {learned_patterns_count} matched")
+    metrics.add_time("pass2_learned_patterns", time.perf_counter() - pass_start)
+    progress("pass2_learned_patterns", int(uncategorized_mask.sum()))
 
     logger.info("PASS 3: Checking predefined category patterns")
-    category_patterns_count = 0
-    for category, patterns in categories["categories"].items():
-        if not patterns:
-            continue
-            
-        escaped_patterns = [re.escape(pattern.lower()) for pattern in patterns]
-        
-        pattern_str = '|'.join(escaped_patterns)
-        
-        pattern_mask = df['Details'].str.lower().str.contains(pattern_str, na=False, regex=True) & uncategorized_mask
-        match_count = pattern_mask.sum()
-        
-        if match_count > 0:
-            logger.info(f"  Category '{category}': {match_count} matches")
-            for idx in df[pattern_mask].index:
-                logger.info(f"    Transaction {idx}: '{df.at[idx, 'Details']}' → '{category}'")
-            df.loc[pattern_mask, 'Category'] = category
-            category_patterns_count += match_count
-            
-        uncategorized_mask = df['Category'].isna()
+    pass_start = time.perf_counter()
+    winners = matcher.match_categories(text)
+    winners[~uncategorized_mask.to_numpy()] = -1
+    category_patterns_count = apply_matches(
+        df, winners, matcher.categories,
+        "  Category '{category}': {count} matches"
+    )
+    uncategorized_mask = df['Category'].isna()
     
     logger.info(f"After category patterns: {uncategorized_mask.sum()} uncategorized, {category_patterns_count} matched")
+    metrics.add_time("pass3_categories", time.perf_counter() - pass_start)
+    metrics.increment("pass1_3_matched", learned_patterns_count + category_patterns_count)
+    progress("pass3_categories", int(uncategorized_mask.sum()))
     
     logger.info("PASS 4: Using LLM for remaining uncategorized transactions")
-    llm_usage_count = 0
-    
-    for idx, row in df[uncategorized_mask].iterrows():
-        description = str(row['Details']) if pd.notna(row['Details']) else ""
+    pass_start = time.perf_counter()
+    llm_rows = np.zeros(len(df), dtype=bool)
+    fallback_rows = np.zeros(len(df), dtype=bool)
+    llm_calls = 0
+    details_column = df.columns.get_loc('Details')
+    category_column = df.columns.get_loc('Category')
+
+    # Group the remaining rows by merchant so each distinct merchant costs at most one LLM call
+    merchant_rows = {}
+    merchant_descriptions = {}
+    log_rows = log_enabled("row")
+    for row in np.flatnonzero(uncategorized_mask.to_numpy()):
+        details = df.iat[row, details_column]
+        description = str(details) if pd.notna(details) else ""
         
         if not description.strip():
-            logger.info(f"  Transaction {idx}: Empty description → 'Miscellaneous'")
-            df.at[idx, 'Category'] = "Miscellaneous"
+            if log_rows:
+                logger.info("  Transaction {}: Empty description → 'Miscellaneous'", df.index[row])
+            df.iat[row, category_column] = "Miscellaneous"
             continue
+
+        merchant = extract_merchant(description) or description.strip().lower()
+        merchant_rows.setdefault(merchant, []).append(row)
+        merchant_descriptions.setdefault(merchant, description)
+
+    log_patterns = log_enabled("pattern")
+    llm_cache = LLMCache(cache_file) if cache_file and merchant_rows else None
+    try:
+        cached = llm_cache.get_many(list(merchant_rows), account_type, llm_model, PROMPT_VERSION) if llm_cache else {}
+
+        misses = [merchant for merchant in merchant_rows if merchant not in cached]
+
+        # Merchants nearly identical to one already categorised skip the LLM
+        neighbours = {}
+        if misses and similarity_threshold is not None:
+            with metrics.timer("nearest_neighbour"):
+                merchant_index = get_merchant_index(categories, categories_file)
+                nearest_categories, similarities = merchant_index.nearest(misses)
+            neighbours = {
+                merchant: category
+                for merchant, category, similarity in zip(misses, nearest_categories, similarities)
+                if category is not None and similarity >= similarity_threshold
+            }
+            misses = [merchant for merchant in misses if merchant not in neighbours]
+            metrics.increment("nearest_neighbour_matched", len(neighbours))
+
+        if misses:
+            logger.info(f"  Using LLM for {len(misses)} merchants in batches of {llm_batch_size}")
+            answers = categorize_many_with_llm(
+                [merchant_descriptions[merchant] for merchant in misses],
+                account_type, llm_model, batch_size=llm_batch_size, max_workers=llm_workers, fallback=None,
+                metrics=metrics
+            )
+            llm_calls = -(-len(misses) // llm_batch_size)
+            # Only real answers are cached, so a timed-out batch is asked again next time
+            if llm_cache:
+                llm_cache.set_many(
+                    {merchant: answer for merchant, answer in zip(misses, answers) if answer is not None},
+                    account_type, llm_model, PROMPT_VERSION
+                )
+            if similarity_threshold is not None:
+                merchant_index.add((merchant, answer) for merchant, answer in zip(misses, answers) if answer is not None)
+        else:
+            answers = []
+        unanswered = {merchant for merchant, answer in zip(misses, answers) if answer is None}
+        llm_categories = {
+            **cached, **neighbours,
+            **{merchant: answer or "Miscellaneous" for merchant, answer in zip(misses, answers)}
+        }
+
+        for merchant, rows in merchant_rows.items():
+            description = merchant_descriptions[merchant]
+            category = llm_categories[merchant]
+            if merchant in cached:
+                source = "Cached LLM categorization"
+            elif merchant in neighbours:
+                source = "Nearest-neighbour categorization"
+            else:
+                source = "LLM categorization"
+            if log_patterns:
+                logger.info("    {}: '{}' → '{}', {} transactions", source, description, category, len(rows))
+
+            df.iloc[rows, category_column] = category
+            llm_rows[rows] = True
+            if merchant in unanswered:
+                fallback_rows[rows] = True
+            
+            if category != "Miscellaneous":
+             
+                if merchant == extract_merchant(description) and len(merchant) > 3:
+                    logger.info("    Adding new pattern: '{}' → '{}'", merchant, category)
+                    new_patterns.append((merchant, category))
+    finally:
+        if llm_cache:
+            llm_cache.close()
+    metrics.add_time("pass4_llm", time.perf_counter() - pass_start)
+    progress("pass4_llm", 0)
+    metrics.increment("llm_merchants", len(merchant_rows))
+    if llm_cache:
+        metrics.increment("llm_cache_hits", llm_cache.hits)
+        metrics.increment("llm_cache_misses", llm_cache.misses)
+    
+    llm_stats = {
+        "llm_calls": llm_calls,
+        "llm_cache_hits": llm_cache.hits if llm_cache else 0,
+        "llm_cache_misses": llm_cache.misses if llm_cache else 0,
+        "nearest_neighbour_hits": len(neighbours)
+    }
+
+    return new_patterns, llm_rows, fallback_rows, llm_stats
+
+def categorize_transactions(df, account_type, categories_file="categories.json", llm_model="gemma3", cache_file="llm_cache.db", llm_batch_size=20, llm_workers=4, store_file="transactions.db", metrics=None, similarity_threshold=0.8, progress=None):
+    """
+    Categorize all transactions in a dataframe.
+
+    Transactions already categorised in an earlier upload are looked up in the
+    transaction store by fingerprint, so only new rows go through the passes.
+    
+    Args:
+        df (pd.DataFrame): DataFrame with transactions
+        account_type (str): The type of account
+        categories_file (str): Path to categories JSON file
+        llm_model (str): Name of the LLM model to use
+        cache_file (str): Path to the LLM categorisation cache, or None to disable it
+        llm_batch_size (int): Number of transactions sent to the LLM per prompt
+        llm_workers (int): Number of LLM batches in flight at once
+        store_file (str): Path to the transaction store, or None to categorise every row
+        metrics (Metrics): Metrics to add to, e.g. ones already holding extraction timings
+        similarity_threshold (float): Nearest-neighbour similarity that skips the LLM, or None
+        progress (callable): Called as progress(stage, uncategorized) once stored categories are
+                             reused ("store_lookup") and after each pass (see run_category_passes)
         
-        logger.info(f"  Using LLM for transaction {idx}: '{description}'")
-        category = categorize_with_llm(description, account_type, llm_model)
-        logger.info(f"    LLM categorization: '{description}' → '{category}'")
-        df.at[idx, 'Category'] = category
-        llm_usage_count += 1
-        
-        if category != "Miscellaneous":
-         
-            merchant = extract_merchant(description)
-            if merchant and len(merchant) > 3:
-                logger.info(f"    Adding new pattern: '{merchant}' → '{category}'")
-                categories["learned_patterns"][merchant] = category
-                new_patterns.append((merchant, category))
+    Returns:
+        tuple: (DataFrame with categories, list of new category mappings, stats dict).
+               stats["metrics"] holds per-pass timers, counters and the LLM latency histogram.
+    """
+    metrics = metrics or Metrics()
+    total_start = time.perf_counter()
+    with metrics.timer("load_categories"):
+        categories = load_categories(categories_file)
+    
+    if 'Category' not in df.columns:
+        df['Category'] = None
+    else:
+        # Work on plain objects while assigning, the canonical categorical dtype is restored at the end
+        df['Category'] = df['Category'].astype(object)
+
+    category_column = df.columns.get_loc('Category')
+    llm_rows = np.zeros(len(df), dtype=bool)
+    reused_rows = np.zeros(len(df), dtype=bool)
+
+    store = TransactionStore(store_file) if store_file else None
+    try:
+        store_start = time.perf_counter()
+        if store:
+            if store.sync_rules(get_rules_store(categories_file).rules_hash()):
+                logger.info("Rules changed since the last run: stored categories dropped")
+
+            fingerprints = transaction_fingerprints(df, account_type)
+            stored = store.get_many(fingerprints.tolist())
+            reused_rows = fingerprints.isin(stored.keys()).to_numpy() & df['Category'].isna().to_numpy()
+
+            reused = [stored[fingerprint] for fingerprint in fingerprints[reused_rows]]
+            df.iloc[reused_rows, category_column] = [category for category, _ in reused]
+            llm_rows[reused_rows] = [source == "llm" for _, source in reused]
+            logger.info(f"Reusing stored categories for {reused_rows.sum()} of {len(df)} transactions")
+            metrics.add_time("store_lookup", time.perf_counter() - store_start)
+            metrics.increment("store_reused", int(reused_rows.sum()))
+        if progress:
+            progress("store_lookup", int((~reused_rows).sum()))
+
+        new_rows = np.flatnonzero(~reused_rows)
+        new_df = df if len(new_rows) == len(df) else df.iloc[new_rows].copy()
+        new_patterns, new_llm_rows, fallback_rows, llm_stats = run_category_passes(
+            new_df, account_type, categories, categories_file, llm_model, cache_file, llm_batch_size, llm_workers, metrics,
+            similarity_threshold, progress
+        )
+
+        if new_df is not df:
+            df.iloc[new_rows, category_column] = new_df['Category'].tolist()
+        llm_rows[new_rows] = new_llm_rows
+
+        # Like the LLM cache, the store skips fallbacks, so those rows are asked again next time
+        stored_rows = new_rows[~fallback_rows]
+        if store and len(stored_rows):
+            store_start = time.perf_counter()
+            store.set_many(zip(
+                fingerprints.iloc[stored_rows],
+                df['Details'].iloc[stored_rows].astype(object).fillna(""),
+                df['Category'].iloc[stored_rows],
+                np.where(new_llm_rows[~fallback_rows], "llm", "pattern"),
+            ))
+            metrics.add_time("store_write", time.perf_counter() - store_start)
+    finally:
+        if store:
+            store.close()
     
     total = len(df)
-    llm_count = llm_usage_count
+    llm_count = int(llm_rows.sum())
     pattern_count = total - llm_count
     
     stats = {
@@ -221,9 +639,17 @@ def categorize_transactions(df, account_type, categories_file="categories.json",
         "pattern_percent": round(pattern_count / total * 100, 1) if total > 0 else 0,
         "llm_count": llm_count,
         "llm_percent": round(llm_count / total * 100, 1) if total > 0 else 0,
-        "new_patterns": len(new_patterns)
+        "new_patterns": len(new_patterns),
+        "reused_count": int(reused_rows.sum()),
+        **llm_stats
     }
     
+    to_canonical(df)
+    
     logger.info(f"Categorization complete: {stats}")
+
+    metrics.increment("rows_categorized", total)
+    metrics.add_time("categorize_total", time.perf_counter() - total_start)
+    stats["metrics"] = metrics.as_dict()
     
-    return df, new_patterns, stats
\ No newline at end of file
+    return df, new_patterns, stats
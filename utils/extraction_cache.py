@@ -0,0 +1,199 @@
+"""
+Disk cache of extracted statements.
+
+Entries are keyed by the SHA-256 of the file contents, the extractor and
+EXTRACTOR_VERSION, stored as Parquet and evicted least-recently-used once the
+cache grows past its size limit. Statements whose transaction years had to be
+inferred from today's date, because no statement date was found, are also keyed
+by that date.
+
+Example:
+    python -m utils.extraction_cache info
+    python -m utils.extraction_cache list
+    python -m utils.extraction_cache clear
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+import pandas as pd
+from utils.file_handler import get_bytes_hash, get_file_hash
+from utils.metrics import Metrics
+from utils.schema import to_canonical
+from utils.transaction_extractor import EXTRACTOR_VERSION, as_binary_source
+
+class ExtractionCache:
+    """
+    Extracted transactions stored as one Parquet file per statement.
+
+    Reading an entry refreshes its modification time, which is what eviction
+    orders by, so the least recently used entries go first.
+    """
+
+    def __init__(self, cache_dir=".extraction_cache", max_bytes=512 * 2**20):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, file_hash, extractor_name, extracted_on=None):
+        suffix = f"-{extracted_on}" if extracted_on else ""
+        return os.path.join(self.cache_dir, f"{extractor_name}-{EXTRACTOR_VERSION}-{file_hash}{suffix}.parquet")
+
+    def get(self, file_hash, extractor_name):
+        """
+        Return the cached transactions for a file, or None.
+
+        Args:
+            file_hash (str): SHA-256 hex digest of the file contents
+            extractor_name (str): Name of the extractor function
+
+        Returns:
+            pd.DataFrame: Transactions in the canonical schema, or None on a miss
+        """
+        # Extractions dated relative to today are only reused on the day they were made
+        for path in (self._path(file_hash, extractor_name), self._path(file_hash, extractor_name, date.today().isoformat())):
+            try:
+                df = pd.read_parquet(path)
+                os.utime(path)
+            except (OSError, ValueError):
+                # Missing, evicted meanwhile, or a partial file from a crashed writer
+                continue
+
+            self.hits += 1
+            return to_canonical(df)
+
+        self.misses += 1
+        return None
+
+    def set(self, file_hash, extractor_name, df):
+        """
+        Store the transactions extracted from a file and evict old entries.
+
+        Transactions with attrs["statement_date"] set to None, whose years were inferred
+        from today's date, are keyed by today's date too.
+        """
+        undated = "statement_date" in df.attrs and df.attrs["statement_date"] is None
+        path = self._path(file_hash, extractor_name, date.today().isoformat() if undated else None)
+        fd, temporary_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            df.to_parquet(temporary_path, index=False)
+            # Readers only ever see complete files
+            os.replace(temporary_path, path)
+        except Exception:
+            os.remove(temporary_path)
+            raise
+
+        self.evict()
+
+    def entries(self):
+        """Return (path, size in bytes, last used time) for every entry, least recently used first."""
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_dir, "*.parquet")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in ``max_bytes``."""
+        with self._lock:
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+
+    def clear(self):
+        """Delete every entry and return how many were removed."""
+        entries = self.entries()
+        for path, _, _ in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+        return len(entries)
+
+def extract_with_cache(extractor, source, cache=None, file_hash=None, metrics=None, **kwargs):
+    """
+    Run an extractor, reusing the cached result when the same file was extracted before.
+
+    Args:
+        extractor (callable): An extractor such as extract_transactions_from_pdf
+        source (str, bytes or file object): The statement, as accepted by the extractor
+        cache (ExtractionCache): The cache to use, or None to always extract
+        file_hash (str): SHA-256 of the file contents, if the caller already has it
+        metrics (Metrics): Where cache hits and misses are recorded
+        **kwargs: Passed on to the extractor
+
+    Returns:
+        pd.DataFrame: Transactions in the canonical schema
+    """
+    metrics = metrics or Metrics()
+    if cache is None:
+        return extractor(source, metrics=metrics, **kwargs)
+
+    if file_hash is None:
+        source = as_binary_source(source)
+        if isinstance(source, str):
+            file_hash = get_file_hash(source)
+        else:
+            file_hash = get_bytes_hash(source.read())
+
+    with metrics.timer("extraction_cache_lookup"):
+        df = cache.get(file_hash, extractor.__name__)
+    if df is not None:
+        metrics.increment("extraction_cache_hits")
+        return df
+
+    metrics.increment("extraction_cache_misses")
+    df = extractor(source, metrics=metrics, **kwargs)
+    if df is not None:
+        cache.set(file_hash, extractor.__name__, df)
+
+    return df
+
+def parse_args(argv=None):
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Inspect or clear the extraction cache.")
+    parser.add_argument("command", choices=["info", "list", "clear"], help="What to do")
+    parser.add_argument("--dir", default=".extraction_cache", help="Cache directory")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Run the cache CLI and return the process exit code."""
+    args = parse_args(argv)
+    cache = ExtractionCache(args.dir)
+
+    if args.command == "clear":
+        print(f"Removed {cache.clear()} cached extractions from {args.dir}")
+        return 0
+
+    entries = cache.entries()
+    if args.command == "list":
+        for path, size, last_used in reversed(entries):
+            last_used_text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(last_used))
+            print(f"{os.path.basename(path):<100} {size / 2**10:>10.1f} KB  last used {last_used_text}")
+
+    total = sum(size for _, size, _ in entries)
+    print(f"{len(entries)} cached extractions, {total / 2**20:.1f} MB of {cache.max_bytes / 2**20:.0f} MB in {args.dir}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,62 @@
+import hashlib
 import os
+import tempfile
+from contextlib import contextmanager
 
-def save_temporary_file(uploaded_file):
+# Uploads larger than this many bytes are spooled to a temporary file instead of read from memory
+SPOOL_THRESHOLD_BYTES = 32 * 2**20
+
+@contextmanager
+def open_upload(uploaded_file, spool_threshold=SPOOL_THRESHOLD_BYTES):
     """
-    Save the uploaded file to a temporary location.
+    Yield a source the extractors can read for an uploaded file.
+
+    Uploads up to ``spool_threshold`` bytes are handed over as the in-memory buffer itself.
+    Larger ones are written to a uniquely named temporary file, memory-mapped by the CSV
+    reader and deleted afterwards, so concurrent uploads with the same name never clash.
+
+    Args:
+        uploaded_file (BytesIO): The uploaded file, e.g. a Streamlit UploadedFile.
+        spool_threshold (int): Largest upload, in bytes, kept in memory.
+
+    Yields:
+        BytesIO or str: The rewound upload, or the path of the temporary file.
     """
-    # Create a temporary directory if it doesn't exist
-    temporary_dir = "temp"
-    os.makedirs(temporary_dir, exist_ok=True)
+    with uploaded_file.getbuffer() as data:
+        if data.nbytes <= spool_threshold:
+            spooled_path = None
+        else:
+            suffix = os.path.splitext(getattr(uploaded_file, "name", ""))[1]
+            fd, spooled_path = tempfile.mkstemp(prefix="upload-", suffix=suffix)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
 
-    temporary_file_path = os.path.join(temporary_dir, uploaded_file.name)
+    if spooled_path is None:
+        uploaded_file.seek(0)
+        yield uploaded_file
+        return
 
-    with open(temporary_file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+    try:
+        yield spooled_path
+    finally:
+        os.remove(spooled_path)
 
-    return temporary_file_path
+def get_bytes_hash(data):
+    """
+    Return the SHA-256 hex digest of in-memory file contents.
+    """
+    return hashlib.sha256(data).hexdigest()
 
-def delete_temporary_file(file_path):
+def get_file_hash(file_path):
     """
-    Delete the temporary file after processing.
+    Return the SHA-256 hex digest of a file, or an empty string if it does not exist.
     """
-    if os.path.exists(file_path):
-        os.remove(file_path)
-    else:
-        print(f"The file {file_path} does not exist.")
\ No newline at end of file
+    if not os.path.exists(file_path):
+        return ""
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
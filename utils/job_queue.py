@@ -0,0 +1,185 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+
+class Job:
+    """
+    One unit of work on a JobQueue and the progress it has reported.
+
+    The function running the job calls update() as it goes; readers on other
+    threads see the latest stage and fraction done, and the result or error once
+    the job finishes.
+    """
+
+    def __init__(self, job_id, name, key=None):
+        self.id = job_id
+        self.name = name
+        self.key = key
+        self.status = "queued"
+        self.stage = "Waiting to start"
+        self.progress = 0.0
+        self.events = []
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        """Whether the job has finished, successfully or not."""
+        return self.status in ("done", "failed")
+
+    def update(self, stage, progress=None):
+        """
+        Report what the job is doing.
+
+        Args:
+            stage (str): Description of the current step.
+            progress (float): Fraction of the job done, between 0 and 1; unchanged if None.
+        """
+        with self._lock:
+            self.stage = stage
+            if progress is not None:
+                self.progress = min(max(progress, 0.0), 1.0)
+            self.events.append((time.time(), stage, self.progress))
+
+    def elapsed(self):
+        """Return the seconds the job has been running, or ran for."""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+class JobQueue:
+    """
+    Runs submitted jobs on a pool of background threads.
+
+    Jobs are keyed, so submitting work that is already queued, running or finished
+    returns the existing job instead of doing it again. That includes failed jobs,
+    which are only retried once forget() drops them, e.g. when the user asks.
+    Threads suit the app's jobs, which spend most of their time waiting on the
+    LLM; jobs must not fork, so any process pool they use starts its workers
+    another way (see utils.transaction_extractor.PAGE_POOL_START_METHOD).
+
+    Only the ``max_finished`` most recently finished jobs are kept, so results do
+    not pile up in a long-running server.
+    """
+
+    def __init__(self, max_workers=2, max_finished=64):
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._keys = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, name, function, *args, key=None, **kwargs):
+        """
+        Queue ``function(job, *args, **kwargs)``; its return value becomes the job's result.
+
+        Args:
+            name (str): Name shown for the job, e.g. the uploaded file name.
+            function (callable): The work; receives the Job first so it can call job.update().
+            key (hashable): Identifies the work; a job with the same key is reused, even a failed one.
+
+        Returns:
+            Job: The queued, or existing, job.
+        """
+        with self._lock:
+            existing = self._find(key)
+            if existing is not None:
+                return existing
+
+            job = Job(next(self._ids), name, key)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._keys[key] = job.id
+
+        self._executor.submit(self._run, job, function, args, kwargs)
+        return job
+
+    def find(self, key):
+        """
+        Return the job for a key, failed or not, or None if submitting it would start a new job.
+
+        Lets callers skip preparing a job's arguments, such as copying an upload, when the work already exists.
+        """
+        with self._lock:
+            return self._find(key)
+
+    def _find(self, key):
+        """Return the job for a key, or None; the caller holds the lock."""
+        return self._jobs.get(self._keys.get(key)) if key is not None else None
+
+    def forget(self, key):
+        """
+        Forget the finished job for a key, so submitting it again redoes the work.
+
+        Returns:
+            bool: Whether a finished job was forgotten; queued and running jobs are kept.
+        """
+        with self._lock:
+            job = self._find(key)
+            if job is None or not job.done:
+                return False
+            self._remove(job)
+
+        return True
+
+    def _run(self, job, function, args, kwargs):
+        job.status = "running"
+        job.started = time.time()
+        try:
+            job.result = function(job, *args, **kwargs)
+            job.update("Done", 1.0)
+            status = "done"
+        except Exception as e:
+            logger.exception(f"Job '{job.name}' failed")
+            job.error = str(e)
+            job.update(f"Failed: {e}")
+            status = "failed"
+
+        # Readers take a finished status to mean the result and finish time are set
+        with self._lock:
+            job.finished = time.time()
+            job.status = status
+            self._forget_oldest()
+
+    def _forget_oldest(self):
+        """Drop the oldest finished jobs beyond ``max_finished``; the caller holds the lock."""
+        finished = sorted((job for job in self._jobs.values() if job.done), key=lambda job: job.finished)
+        for job in finished[:max(len(finished) - self.max_finished, 0)]:
+            self._remove(job)
+
+    def get(self, job_id):
+        """Return a job by id, or None if it was cleared."""
+        return self._jobs.get(job_id)
+
+    def jobs(self, job_ids=None):
+        """Return the given jobs, or all of them, in submission order; cleared ids are skipped."""
+        with self._lock:
+            if job_ids is None:
+                return sorted(self._jobs.values(), key=lambda job: job.id)
+            return [self._jobs[job_id] for job_id in job_ids if job_id in self._jobs]
+
+    def clear(self):
+        """Forget every finished job, so its work is done again if resubmitted."""
+        with self._lock:
+            finished = [job for job in self._jobs.values() if job.done]
+            for job in finished:
+                self._remove(job)
+
+        return len(finished)
+
+    def _remove(self, job):
+        """Forget a job; the caller holds the lock."""
+        del self._jobs[job.id]
+        if self._keys.get(job.key) == job.id:
+            del self._keys[job.key]
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs and, if ``wait``, wait for the running ones."""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,119 @@
+import sqlite3
+import threading
+import time
+
+class LLMCache:
+    """
+    On-disk cache of LLM categorisations stored in SQLite.
+
+    Entries are keyed by (merchant, account type, model, prompt version), expire after
+    ``ttl_seconds`` and are evicted least-recently-used once there are more than
+    ``max_entries`` of them.
+    """
+
+    def __init__(self, cache_file="llm_cache.db", ttl_seconds=30 * 24 * 3600, max_entries=50000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(cache_file, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                merchant TEXT NOT NULL,
+                account_type TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                category TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                PRIMARY KEY (merchant, account_type, model, prompt_version)
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used_at)")
+        self._connection.commit()
+
+    def get_many(self, merchants, account_type, model, prompt_version):
+        """
+        Look up cached categories for several merchants at once.
+
+        Args:
+            merchants (list): Normalised merchant keys
+            account_type (str): The type of account
+            model (str): Name of the LLM model
+            prompt_version (str): Version of the categorisation prompt
+
+        Returns:
+            dict: Merchant → category for every unexpired entry found
+        """
+        now = time.time()
+        found = {}
+        with self._lock:
+            for merchant in merchants:
+                row = self._connection.execute(
+                    """
+                    SELECT category FROM llm_cache
+                    WHERE merchant = ? AND account_type = ? AND model = ? AND prompt_version = ? AND created_at >= ?
+                    """,
+                    (merchant, account_type, model, prompt_version, now - self.ttl_seconds),
+                ).fetchone()
+                if row is not None:
+                    found[merchant] = row[0]
+
+            self._connection.executemany(
+                """
+                UPDATE llm_cache SET last_used_at = ?
+                WHERE merchant = ? AND account_type = ? AND model = ? AND prompt_version = ?
+                """,
+                [(now, merchant, account_type, model, prompt_version) for merchant in found],
+            )
+            self._connection.commit()
+
+        self.hits += len(found)
+        self.misses += len(merchants) - len(found)
+        return found
+
+    def set(self, merchant, account_type, model, prompt_version, category):
+        """Store a categorisation and evict expired and least-recently-used entries."""
+        self.set_many({merchant: category}, account_type, model, prompt_version)
+
+    def set_many(self, categories, account_type, model, prompt_version):
+        """
+        Store several categorisations in one transaction and evict old entries.
+
+        Args:
+            categories (dict): Merchant → category
+            account_type (str): The type of account
+            model (str): Name of the LLM model
+            prompt_version (str): Version of the categorisation prompt
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                """
+                INSERT OR REPLACE INTO llm_cache
+                    (merchant, account_type, model, prompt_version, category, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (merchant, account_type, model, prompt_version, category, now, now)
+                    for merchant, category in categories.items()
+                ],
+            )
+            self._connection.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._connection.execute(
+                """
+                DELETE FROM llm_cache WHERE rowid IN (
+                    SELECT rowid FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self._connection.commit()
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._connection.close()
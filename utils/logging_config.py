@@ -0,0 +1,54 @@
+import sys
+from loguru import logger
+
+# How much the categoriser logs about its matches, from least to most
+VERBOSITY_LEVELS = ("summary", "pattern", "row")
+
+_settings = {"verbosity": "summary", "handler_id": None, "config": None}
+
+def configure_logging(log_file="finance_tracker.log", verbosity="summary", level="INFO", enqueue=True):
+    """
+    Send log records to a rotating file and set how much the categoriser logs.
+
+    Call this once from an entry point (the app or a CLI), not at import. Calling it
+    again with the same settings does nothing; other settings replace the handler
+    added by the previous call, leaving handlers added elsewhere untouched.
+
+    Args:
+        log_file (str): Log file path, or None to log to stderr.
+        verbosity (str): "summary" for one line per pass, "pattern" to add one line per
+                         matched pattern or merchant, "row" to add one line per transaction.
+        level (str): Minimum level written.
+        enqueue (bool): Write records from a background thread, so logging never blocks
+                        the categoriser on file I/O.
+    """
+    set_verbosity(verbosity)
+
+    config = (log_file, level, enqueue)
+    if _settings["config"] == config:
+        return
+
+    if _settings["handler_id"] is None:
+        # Replace loguru's default stderr handler the first time round
+        try:
+            logger.remove(0)
+        except ValueError:
+            pass
+    else:
+        logger.remove(_settings["handler_id"])
+
+    if log_file:
+        _settings["handler_id"] = logger.add(log_file, rotation="10 MB", level=level, enqueue=enqueue)
+    else:
+        _settings["handler_id"] = logger.add(sys.stderr, level=level, enqueue=enqueue)
+    _settings["config"] = config
+
+def set_verbosity(verbosity):
+    """Set how much the categoriser logs; one of VERBOSITY_LEVELS."""
+    if verbosity not in VERBOSITY_LEVELS:
+        raise ValueError(f"Unknown log verbosity '{verbosity}', expected one of {', '.join(VERBOSITY_LEVELS)}")
+    _settings["verbosity"] = verbosity
+
+def log_enabled(verbosity):
+    """Return whether messages at the given verbosity should be logged."""
+    return VERBOSITY_LEVELS.index(_settings["verbosity"]) >= VERBOSITY_LEVELS.index(verbosity)
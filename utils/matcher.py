@@ -0,0 +1,179 @@
+import re
+import numpy as np
+import pandas as pd
+
+# Characters that change the meaning of a pattern passed to ``str.contains``
+REGEX_METACHARACTERS = frozenset(".^$*+?{}[]\\|()")
+
+def is_literal(pattern):
+    """Return True if a pattern matches the same text as a regex and as a plain substring."""
+    return bool(pattern) and "\n" not in pattern and not REGEX_METACHARACTERS.intersection(pattern)
+
+def _build_trie(patterns):
+    """Build a character trie; the empty-string key marks the end of a pattern."""
+    root = {}
+    for pattern in patterns:
+        node = root
+        for char in pattern:
+            node = node.setdefault(char, {})
+        node[""] = pattern
+    return root
+
+def _trie_to_regex(node):
+    """
+    Turn a trie into a regex that matches the longest pattern starting at a position.
+
+    Branches never share a first character, so the regex engine follows a single path
+    down the trie instead of trying every pattern in turn.
+    """
+    branches = [
+        re.escape(char) + _trie_to_regex(child)
+        for char, child in sorted(node.items())
+        if char != ""
+    ]
+    if not branches:
+        return ""
+
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        body = "(?:" + body + ")?"
+    return body
+
+class LoweredText:
+    """
+    A lowercased text column laid out once for every pattern pass.
+
+    Repeated descriptions are scanned once: the distinct values are joined with newlines
+    into a single string so each pass is one regex sweep, and match positions are mapped
+    back to rows with a binary search over value offsets.
+    """
+
+    def __init__(self, details):
+        # Plain Python strings keep str.contains on Python regex semantics for any string dtype
+        lowered = details.str.lower().astype(object)
+        self.series = lowered
+        self.stripped = lowered.str.strip()
+
+        # Missing values get code -1, which picks the trailing "no match" slot in best_match
+        self.codes, uniques = pd.factorize(lowered)
+        values = list(uniques)
+
+        lengths = np.fromiter((len(value) + 1 for value in values), dtype=np.int64, count=len(values))
+        self.starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(values) else np.zeros(0, dtype=np.int64)
+        self.blob = "\n".join(values)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def values_for(self, positions):
+        """Map character positions in the joined text back to distinct value positions."""
+        return np.searchsorted(self.starts, positions, side="right") - 1
+
+class PatternSet:
+    """
+    Substring patterns compiled into a single regex, each carrying a priority rank.
+
+    ``best_match`` returns, for every row, the highest rank among the patterns found
+    in that row (or -1). Patterns that are not plain literals keep their exact
+    ``Series.str.contains`` semantics through a per-pattern fallback.
+    """
+
+    def __init__(self, patterns, ranks, regex=True):
+        self.regex = regex
+        self.fallback = []
+        literal_ranks = {}
+
+        for pattern, rank in zip(patterns, ranks):
+            literal = is_literal(pattern) if regex else bool(pattern) and "\n" not in pattern
+            if literal:
+                literal_ranks[pattern] = max(rank, literal_ranks.get(pattern, -1))
+            else:
+                self.fallback.append((pattern, rank))
+
+        # A pattern found at a position implies every shorter pattern that is a prefix of it,
+        # so store the best rank over all prefixes against the longest one.
+        self.prefix_rank = {}
+        trie = _build_trie(literal_ranks)
+        stack = [(trie, -1)]
+        while stack:
+            node, best = stack.pop()
+            if "" in node:
+                best = max(best, literal_ranks[node[""]])
+                self.prefix_rank[node[""]] = best
+            stack.extend((child, best) for char, child in node.items() if char != "")
+
+        self.compiled = re.compile("(?=(" + _trie_to_regex(trie) + "))") if literal_ranks else None
+
+    def best_match(self, text):
+        """Return the highest matching rank per row of a LoweredText, or -1."""
+        best_values = np.full(len(text.starts) + 1, -1, dtype=np.int64)
+
+        if self.compiled is not None and text.blob:
+            found = [(match.start(), self.prefix_rank[match.group(1)]) for match in self.compiled.finditer(text.blob)]
+            if found:
+                positions, ranks = np.array(found, dtype=np.int64).T
+                np.maximum.at(best_values, text.values_for(positions), ranks)
+
+        best = best_values[text.codes]
+
+        for pattern, rank in self.fallback:
+            mask = text.series.str.contains(pattern, na=False, regex=self.regex).to_numpy(dtype=bool)
+            best[mask] = np.maximum(best[mask], rank)
+
+        return best
+
+class CategoryMatcher:
+    """
+    The substring passes of ``categorize_transactions`` compiled once from categories.json.
+
+    Each pass returns, per row, the position of the winning pattern in its pass
+    (or -1), following the same precedence as applying the patterns one at a time:
+    the last matching account term or learned pattern wins, and the first matching
+    predefined category wins.
+    """
+
+    def __init__(self, categories):
+        self.account_terms = {}
+        for account_type, terms in categories.get("account_terms", {}).items():
+            items = list(terms.items())
+            exact = {}
+            for rank, (term, _) in enumerate(items):
+                exact[term.lower()] = rank
+            self.account_terms[account_type] = (
+                items,
+                exact,
+                PatternSet([term for term, _ in items], range(len(items))),
+            )
+
+        self.learned_patterns = list((categories.get("learned_patterns") or {}).items())
+        self.learned_set = PatternSet(
+            [merchant for merchant, _ in self.learned_patterns],
+            range(len(self.learned_patterns)),
+        )
+
+        # (patterns, category) pairs, in the same shape as the other passes' (pattern, category)
+        self.categories = [(patterns, category) for category, patterns in categories.get("categories", {}).items() if patterns]
+        patterns, ranks = [], []
+        last = len(self.categories) - 1
+        for position, (category_patterns, _) in enumerate(self.categories):
+            for pattern in category_patterns:
+                patterns.append(pattern.lower())
+                ranks.append(last - position)
+        self.category_set = PatternSet(patterns, ranks, regex=False)
+
+    def match_account_terms(self, text, account_type, uncategorized):
+        """Return the winning account term per row; exact matches also apply to categorised rows."""
+        items, exact_terms, term_set = self.account_terms[account_type]
+
+        exact = text.stripped.map(exact_terms).fillna(-1).to_numpy(dtype=np.int64)
+        partial = term_set.best_match(text)
+        return np.where(uncategorized, np.maximum(exact, partial), exact)
+
+    def match_learned_patterns(self, text):
+        """Return the winning learned pattern per row."""
+        return self.learned_set.best_match(text)
+
+    def match_categories(self, text):
+        """Return the winning predefined category per row."""
+        best = self.category_set.best_match(text)
+        return np.where(best >= 0, len(self.categories) - 1 - best, -1)
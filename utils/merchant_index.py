@@ -0,0 +1,165 @@
+import re
+import threading
+import numpy as np
+
+# Runs of anything but letters; digits are dropped so store and reference numbers do not count
+NON_LETTERS = re.compile(r"[^a-z]+")
+
+def normalise_merchant(text):
+    """Lowercase a merchant name and reduce it to letters separated by single spaces."""
+    return NON_LETTERS.sub(" ", text.lower()).strip()
+
+def char_ngrams(text, n=3):
+    """Return the character n-grams of a normalised merchant name, padded with spaces."""
+    padded = f" {text} "
+    return [padded[start:start + n] for start in range(max(len(padded) - n + 1, 1))]
+
+class MerchantIndex:
+    """
+    Character n-gram TF-IDF index of categorised merchant names.
+
+    Vectors are kept as sparse (document, feature, count) triples that grow as merchants
+    are added, and IDF weights are computed at query time, so adding merchants never
+    rebuilds anything. A lookup scores a whole batch of queries against every indexed
+    merchant with a few array operations over an inverted index.
+
+    The index is shared by concurrent categorisations, so adding merchants and looking
+    them up are serialised by a lock.
+    """
+
+    def __init__(self, ngram=3):
+        self.ngram = ngram
+        self.texts = []
+        self.categories = []
+        self._features = {}
+        self._document_frequency = []
+        self._entries = []
+        self._postings = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, merchants):
+        """
+        Add categorised merchants to the index.
+
+        Args:
+            merchants (iterable): (merchant, category) pairs. Merchants that normalise to
+                                  nothing are skipped; the latest category wins for duplicates.
+        """
+        # Consume the input first, so a generator is never iterated while the lock is held
+        merchants = list(merchants)
+        with self._lock:
+            self._add(merchants)
+
+    def _add(self, merchants):
+        documents, features, counts = [], [], []
+        for merchant, category in merchants:
+            text = normalise_merchant(merchant)
+            if not text:
+                continue
+
+            document = len(self.texts)
+            self.texts.append(text)
+            self.categories.append(category)
+
+            grams, gram_counts = np.unique(char_ngrams(text, self.ngram), return_counts=True)
+            for gram, count in zip(grams, gram_counts):
+                feature = self._features.setdefault(gram, len(self._features))
+                if feature == len(self._document_frequency):
+                    self._document_frequency.append(0)
+                self._document_frequency[feature] += 1
+                documents.append(document)
+                features.append(feature)
+                counts.append(count)
+
+        if documents:
+            self._entries.append((
+                np.array(documents, dtype=np.int64),
+                np.array(features, dtype=np.int64),
+                np.array(counts, dtype=np.float64),
+            ))
+            self._postings = None
+
+    def _idf(self, document_frequency):
+        return np.log((1 + len(self.texts)) / (1 + document_frequency)) + 1
+
+    def _build_postings(self):
+        """Lay the index out by feature, with IDF-weighted, unit-length document vectors."""
+        documents, features, counts = (np.concatenate(column) for column in zip(*self._entries))
+        self._entries = [(documents, features, counts)]
+
+        weights = counts * self._idf(np.array(self._document_frequency, dtype=np.float64))[features]
+        norms = np.sqrt(np.bincount(documents, weights=weights ** 2, minlength=len(self.texts)))
+        weights /= norms[documents]
+
+        order = np.argsort(features, kind="stable")
+        starts = np.searchsorted(features[order], np.arange(len(self._features) + 1))
+        self._postings = (documents[order], weights[order], starts)
+
+    def nearest(self, merchants, chunk_size=256):
+        """
+        Find the most similar indexed merchant for each query.
+
+        Args:
+            merchants (list): Merchant names to look up.
+            chunk_size (int): Queries scored at once, which bounds the memory used.
+
+        Returns:
+            tuple: (list of categories, None where nothing shares an n-gram,
+                    np.ndarray of cosine similarities between 0 and 1)
+        """
+        with self._lock:
+            return self._nearest(merchants, chunk_size)
+
+    def _nearest(self, merchants, chunk_size):
+        categories = [None] * len(merchants)
+        scores = np.zeros(len(merchants))
+        if not merchants or not self.texts:
+            return categories, scores
+
+        if self._postings is None:
+            self._build_postings()
+        posting_documents, posting_weights, starts = self._postings
+        document_frequency = np.array(self._document_frequency, dtype=np.float64)
+
+        for chunk_start in range(0, len(merchants), chunk_size):
+            queries, features, weights, norms = [], [], [], []
+            for query, merchant in enumerate(merchants[chunk_start:chunk_start + chunk_size]):
+                grams, counts = np.unique(char_ngrams(normalise_merchant(merchant), self.ngram), return_counts=True)
+                known = np.array([self._features.get(gram, -1) for gram in grams], dtype=np.int64)
+                # N-grams the index has never seen still count towards the query's length
+                idf = np.where(known >= 0, self._idf(document_frequency[np.maximum(known, 0)]), self._idf(0))
+                query_weights = counts * idf
+                norms.append(np.sqrt(np.sum(query_weights ** 2)))
+                queries.extend([query] * int((known >= 0).sum()))
+                features.extend(known[known >= 0])
+                weights.extend(query_weights[known >= 0])
+
+            if not queries:
+                continue
+            queries, features, weights = np.array(queries), np.array(features, dtype=np.int64), np.array(weights)
+
+            # Expand every (query, feature) pair into the postings of that feature
+            lengths = starts[features + 1] - starts[features]
+            offsets = np.repeat(starts[features] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            pair_queries = np.repeat(queries, lengths)
+            contributions = np.repeat(weights, lengths) * posting_weights[offsets]
+
+            # Sum contributions per (query, document), then keep each query's best document
+            keys = pair_queries * len(self.texts) + posting_documents[offsets]
+            unique_keys, inverse = np.unique(keys, return_inverse=True)
+            similarities = np.bincount(inverse, weights=contributions)
+            key_queries, key_documents = np.divmod(unique_keys, len(self.texts))
+            similarities /= np.array(norms)[key_queries]
+
+            # Ties go to the most recently added merchant
+            order = np.lexsort((-key_documents, -similarities, key_queries))
+            first = np.concatenate(([True], key_queries[order][1:] != key_queries[order][:-1]))
+            for position in order[first]:
+                query = chunk_start + key_queries[position]
+                categories[query] = self.categories[key_documents[position]]
+                scores[query] = min(similarities[position], 1.0)
+
+        return categories, scores
@@ -0,0 +1,114 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the LLM latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class Metrics:
+    """
+    Timers, counters and histograms collected while processing a statement.
+
+    Safe to update from several threads. ``as_dict`` gives a plain, picklable
+    snapshot that is returned in the categoriser stats and can be written out
+    in Prometheus text format with ``write_prometheus``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timers = {}
+        self.counters = {}
+        self.histograms = {}
+
+    @contextmanager
+    def timer(self, name):
+        """Add the wall-clock time spent in the block to timer ``name``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        """Add seconds to timer ``name``."""
+        with self._lock:
+            self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    def increment(self, name, amount=1):
+        """Add to counter ``name``."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS):
+        """Record a value in histogram ``name``."""
+        with self._lock:
+            histogram = self.histograms.setdefault(
+                name, {"buckets": {bound: 0 for bound in buckets}, "sum": 0.0, "count": 0, "values": []}
+            )
+            for bound in histogram["buckets"]:
+                if value <= bound:
+                    histogram["buckets"][bound] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+            histogram["values"].append(value)
+
+    def merge(self, other):
+        """Fold a snapshot from ``as_dict`` (for example from a worker process) into these metrics."""
+        for name, seconds in other.get("timers", {}).items():
+            self.add_time(name, seconds)
+        for name, amount in other.get("counters", {}).items():
+            self.increment(name, amount)
+        for name, histogram in other.get("histograms", {}).items():
+            for value in histogram["values"]:
+                self.observe(name, value, tuple(histogram["buckets"]))
+
+    def as_dict(self):
+        """Return a plain snapshot of every metric."""
+        with self._lock:
+            return {
+                "timers": {name: round(seconds, 6) for name, seconds in self.timers.items()},
+                "counters": dict(self.counters),
+                "histograms": {
+                    name: {
+                        "buckets": dict(histogram["buckets"]),
+                        "sum": histogram["sum"],
+                        "count": histogram["count"],
+                        "values": list(histogram["values"]),
+                    }
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+def format_prometheus(snapshot, prefix="finance_tracker"):
+    """
+    Render a metrics snapshot in the Prometheus text exposition format.
+
+    Args:
+        snapshot (dict): Output of Metrics.as_dict().
+        prefix (str): Prefix added to every metric name.
+
+    Returns:
+        str: The metrics text.
+    """
+    lines = []
+    for name, seconds in sorted(snapshot.get("timers", {}).items()):
+        metric = f"{prefix}_{name}_seconds"
+        lines += [f"# TYPE {metric} gauge", f"{metric} {seconds}"]
+    for name, amount in sorted(snapshot.get("counters", {}).items()):
+        metric = f"{prefix}_{name}_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {amount}"]
+    for name, histogram in sorted(snapshot.get("histograms", {}).items()):
+        metric = f"{prefix}_{name}_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        lines += [f'{metric}_bucket{{le="{bound}"}} {count}' for bound, count in histogram["buckets"].items()]
+        lines += [
+            f'{metric}_bucket{{le="+Inf"}} {histogram["count"]}',
+            f"{metric}_sum {histogram['sum']}",
+            f"{metric}_count {histogram['count']}",
+        ]
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(snapshot, path, prefix="finance_tracker"):
+    """Write a metrics snapshot to a Prometheus text-format file, e.g. for the node exporter textfile collector."""
+    with open(path, "w") as f:
+        f.write(format_prometheus(snapshot, prefix))
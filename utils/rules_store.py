@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+@contextmanager
+def file_lock(lock_file):
+    """Hold an exclusive lock on ``lock_file`` across processes for the duration of the block."""
+    with open(lock_file, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class RulesStore:
+    """
+    The categories file plus a journal of learned patterns approved since it was last written.
+
+    Approving patterns appends one JSON line per pattern to ``<categories file>.journal``
+    instead of rewriting the whole file; the journal is folded back into the categories
+    file, through an atomic rename, once it holds ``compact_after`` patterns. Every write,
+    and every read of the files, happens under a lock file so concurrent processes never
+    lose updates or see a half-written file.
+
+    The parsed rules are kept in memory and only re-read when the files change; when only
+    the journal grew, only the new lines are parsed.
+    """
+
+    def __init__(self, categories_file="categories.json", compact_after=1000):
+        self.categories_file = categories_file
+        self.journal_file = categories_file + ".journal"
+        self.lock_file = categories_file + ".lock"
+        self.compact_after = compact_after
+        self._lock = threading.Lock()
+        self._categories = None
+        self._base_version = None
+        self._journal_offset = 0
+        self._journal_lines = 0
+        self._loaded_version = None
+        self._hashed_version = None
+        self._rules_hash = None
+
+    def _stat(self, path):
+        try:
+            stat = os.stat(path)
+            return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            return None
+
+    def version(self):
+        """Return what identifies the current rules; it changes whenever either file changes."""
+        return (os.path.abspath(self.categories_file), self._stat(self.categories_file), self._stat(self.journal_file))
+
+    def _read_journal(self):
+        """Apply journal lines written since the last read, replacing the in-memory rules with an updated copy."""
+        try:
+            with open(self.journal_file, "rb") as f:
+                f.seek(self._journal_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+
+        # A line without its newline is still being written and is read next time
+        complete = data[:data.rfind(b"\n") + 1]
+        patterns = [json.loads(line) for line in complete.splitlines() if line.strip()]
+        if patterns:
+            # Rules already returned by load() are snapshots, so new ones go into a copy
+            self._categories = {
+                **self._categories,
+                "learned_patterns": {**self._categories["learned_patterns"], **dict(patterns)},
+            }
+            self._journal_lines += len(patterns)
+        self._journal_offset += len(complete)
+
+    def _refresh(self):
+        """Bring the in-memory rules up to date with the files; the caller holds the locks."""
+        base_version = self._stat(self.categories_file)
+        if base_version is None:
+            self._categories, self._base_version = None, None
+            return
+
+        journal_version = self._stat(self.journal_file)
+        shrunk = journal_version is None or journal_version[1] < self._journal_offset
+        if self._categories is None or base_version != self._base_version or shrunk:
+            with open(self.categories_file, "r") as f:
+                self._categories = json.load(f)
+            self._categories.setdefault("learned_patterns", {})
+            self._base_version = base_version
+            self._journal_offset = 0
+            self._journal_lines = 0
+
+        self._read_journal()
+
+    def load(self):
+        """
+        Return the current rules, re-reading the files only when they changed.
+
+        The returned dict is shared; callers must not modify it. It never changes after
+        being returned either: later changes to the rules produce a new dict.
+
+        Returns:
+            dict: Category mappings, or None if the categories file does not exist
+        """
+        version = self.version()
+        with self._lock:
+            if self._categories is not None and version == self._loaded_version:
+                return self._categories
+
+            with file_lock(self.lock_file):
+                self._refresh()
+                self._loaded_version = self.version()
+            return self._categories
+
+    def add_patterns(self, patterns):
+        """
+        Save learned patterns by appending them to the journal.
+
+        Args:
+            patterns (list): (merchant, category) pairs; later pairs win for the same merchant
+        """
+        lines = "".join(json.dumps([merchant, category]) + "\n" for merchant, category in patterns)
+        if not lines:
+            return
+
+        with self._lock, file_lock(self.lock_file):
+            with open(self.journal_file, "a", encoding="utf-8") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._refresh()
+            if self._journal_lines >= self.compact_after:
+                self._compact()
+            self._loaded_version = self.version()
+
+    def compact(self):
+        """Fold the journal into the categories file."""
+        with self._lock, file_lock(self.lock_file):
+            self._refresh()
+            self._compact()
+            self._loaded_version = self.version()
+
+    def _compact(self):
+        if self._categories is None or self._journal_lines == 0:
+            return
+
+        directory = os.path.dirname(os.path.abspath(self.categories_file))
+        fd, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._categories, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            # Readers see either the old or the new file, never a partial one
+            os.replace(temporary_path, self.categories_file)
+        except Exception:
+            os.remove(temporary_path)
+            raise
+
+        # Every journal line is now in the categories file
+        os.remove(self.journal_file)
+        self._base_version = self._stat(self.categories_file)
+        self._journal_offset = 0
+        self._journal_lines = 0
+
+    def rules_hash(self):
+        """
+        Return a SHA-256 hex digest of the categories file and journal contents, or "" if there are no rules.
+
+        Like load(), the files are only read and hashed again when they changed.
+        """
+        if not os.path.exists(self.categories_file):
+            return ""
+
+        version = self.version()
+        with self._lock:
+            if self._rules_hash is not None and version == self._hashed_version:
+                return self._rules_hash
+
+            digest = hashlib.sha256()
+            # Locked so a compaction cannot happen between reading the two files
+            with file_lock(self.lock_file):
+                for path in (self.categories_file, self.journal_file):
+                    try:
+                        with open(path, "rb") as f:
+                            for chunk in iter(lambda: f.read(1 << 20), b""):
+                                digest.update(chunk)
+                    except FileNotFoundError:
+                        pass
+                    digest.update(b"\0")
+                self._hashed_version = self.version()
+
+            self._rules_hash = digest.hexdigest()
+            return self._rules_hash
+
+# One store per categories file, shared by every caller in the process
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_rules_store(categories_file="categories.json"):
+    """Return the shared RulesStore for a categories file."""
+    path = os.path.abspath(categories_file)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = RulesStore(categories_file)
+        return _stores[path]
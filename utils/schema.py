@@ -0,0 +1,64 @@
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = pd.StringDtype("pyarrow")
+except ImportError:
+    STRING_DTYPE = pd.StringDtype("python")
+
+MONTHS = [
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December"
+]
+
+MONTH_DTYPE = pd.CategoricalDtype(MONTHS, ordered=True)
+TRANSACTION_TYPE_DTYPE = pd.CategoricalDtype(["Debit", "Credit"])
+
+# Columns every extractor produces, in order
+TRANSACTION_COLUMNS = ["Date", "Year", "Month", "Details", "Amount", "Debit/Credit"]
+
+# Canonical dtype of every transaction column, including the ones added after extraction
+TRANSACTION_SCHEMA = {
+    "Date": "datetime64[ns]",
+    "Year": "Int16",
+    "Month": MONTH_DTYPE,
+    "Details": STRING_DTYPE,
+    "Amount": "float64",
+    "Debit/Credit": TRANSACTION_TYPE_DTYPE,
+    "Account Type": "category",
+    "Category": "category",
+}
+
+def month_names(dates):
+    """
+    Return the month of each date as a MONTH_DTYPE categorical.
+
+    Args:
+        dates (pd.Series): datetime64 values.
+
+    Returns:
+        pd.Categorical: Month names, missing where the date is missing.
+    """
+    codes = dates.dt.month.fillna(0).astype("int8").to_numpy() - 1
+    return pd.Categorical.from_codes(codes, dtype=MONTH_DTYPE)
+
+def to_canonical(df):
+    """
+    Convert the transaction columns of a DataFrame to their canonical dtypes, in place.
+
+    Columns that are missing are left out, and columns already in the right dtype are not copied.
+
+    Args:
+        df (pd.DataFrame): DataFrame with transactions.
+
+    Returns:
+        pd.DataFrame: The same DataFrame.
+    """
+    for column, dtype in TRANSACTION_SCHEMA.items():
+        if column not in df.columns:
+            continue
+
+        if df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+
+    return df
@@ -1,137 +1,511 @@
-import pdfplumber
+import csv
+import io
+import multiprocessing
+import os
+import numpy as np
 import pandas as pd
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from loguru import logger
+from utils.metrics import Metrics
+from utils.schema import MONTHS, TRANSACTION_COLUMNS, TRANSACTION_TYPE_DTYPE, month_names, to_canonical
 
-def extract_transactions_from_pdf(pdf_path, debug = False):
+# Statements with more pages than this are extracted on a process pool, if the caller allows it
+PARALLEL_PAGE_THRESHOLD = 8
+
+# Page workers are started from a clean server process rather than forked, so callers
+# running on threads, such as the app's job queue, can opt in safely
+PAGE_POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# Bump whenever extraction output changes so cached extractions are not reused
+EXTRACTOR_VERSION = "3"
+
+def open_pdf(source, **kwargs):
+    """
+    Open a PDF statement with pdfplumber.
+
+    pdfplumber and its PDF parser are imported here rather than at module import,
+    so sessions and workers that only handle CSV statements never load them.
+
+    Args:
+        source (str, bytes or file object): The PDF, as accepted by as_binary_source.
+        **kwargs: Passed on to pdfplumber.open, e.g. ``pages``.
+
+    Returns:
+        pdfplumber.PDF: The open document, for use as a context manager.
+    """
+    import pdfplumber
+
+    return pdfplumber.open(as_binary_source(source), **kwargs)
+
+def extract_page_lines(page):
+    """
+    Extract the text lines of a two-column statement page.
+
+    Args:
+        page (pdfplumber.page.Page): The page to read.
+
+    Returns:
+        list: Lines from the left half followed by lines from the right half.
+    """
+    width, height = page.width, page.height
+
+    # Split the page into left and right halves
+    left_part = page.crop((0, 0, width / 2, height))
+    right_part = page.crop((width / 2, 0, width, height))
+    
+    # Extract text from both halves and combine into a list of lines
+    page_lines = []
+    for part in (left_part, right_part):
+        text = part.extract_text()
+        if text:
+            page_lines.extend(text.split("\n"))
+
+    return page_lines
+
+def as_binary_source(source):
+    """
+    Return a statement source that pdfplumber and pandas can read.
+
+    Paths are returned unchanged, bytes-like objects are wrapped in a BytesIO without
+    copying, and binary file objects are rewound to the start.
+
+    Args:
+        source (str, bytes, memoryview or file object): The statement.
+
+    Returns:
+        str or file object: A path or a readable binary stream.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+
+    source.seek(0)
+    return source
+
+def extract_page_range_lines(pdf_path, start, stop):
+    """
+    Extract the text lines of pages ``start`` to ``stop - 1``, in page order.
+
+    Each process pool worker opens the PDF itself and handles one range of pages.
+    ``pdf_path`` may also be the PDF's bytes or an open binary stream.
+
+    Returns:
+        tuple: (list of lines, list of seconds spent on each page)
+    """
+    lines, page_seconds = [], []
+    with open_pdf(pdf_path) as pdf:
+        for page in pdf.pages[start:stop]:
+            page_start = time.perf_counter()
+            lines.extend(extract_page_lines(page))
+            # Release the parsed page objects before moving on
+            page.close()
+            page_seconds.append(time.perf_counter() - page_start)
+    return lines, page_seconds
+
+def split_page_ranges(first_page, page_count, chunks):
+    """Split pages ``first_page`` to ``page_count - 1`` into at most ``chunks`` contiguous ranges."""
+    pages = page_count - first_page
+    chunks = max(1, min(chunks, pages))
+    size, extra = divmod(pages, chunks)
+
+    ranges = []
+    start = first_page
+    for chunk in range(chunks):
+        stop = start + size + (1 if chunk < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+# Header and footer lines that are never transactions
+SKIP_LINE = re.compile(
+    "Page|Your transactions|Your previous balance|Payments towards your account|Understanding your interest"
+)
+
+# "DD Mon DESCRIPTION £1,234.56[CR]". The lookahead finds the first amount on the line,
+# and the description runs up to the last occurrence of that amount.
+TRANSACTION_LINE = re.compile(
+    r"^(?P<day>\d{1,2})\s+(?P<month>[A-Za-z]{3})"
+    r"(?=.*?(?P<amount>-?£[\d,]+\.\d{2}(?:CR)?))"
+    r"(?P<details>.*)(?P=amount)"
+)
+
+MONTH_NUMBERS = {month[:3].lower(): number for number, month in enumerate(MONTHS, start=1)}
+
+# "12 March 2024" or "12 Mar 2024", as printed on the summary page
+FULL_DATE = r"(\d{1,2})\s+([A-Za-z]{3,9})\.?,?\s+(\d{4})"
+# Labelled dates that fall on or shortly after a statement's last transaction, most exact first.
+# Other dates on the page, such as promotional rate end dates, can be far in the future.
+STATEMENT_DATE_LABELS = [
+    re.compile(r"Statement\s+date:?\s+" + FULL_DATE, re.IGNORECASE),
+    re.compile(r"Statement\s+period:?[^\n]*?\s(?:to|-|–)\s+" + FULL_DATE, re.IGNORECASE),
+    re.compile(r"Payment\s+due(?:\s+date|\s+by)?:?\s+" + FULL_DATE, re.IGNORECASE),
+]
+# Top share of the summary page searched for the statement date, which is printed in its header
+SUMMARY_HEADER_SHARE = 0.5
+
+def parse_statement_date(summary_text):
+    """
+    Find the date a statement was issued on its summary page.
+
+    Only labelled dates are used: the statement date, else the end of the statement
+    period, else the payment due date, which is a few weeks later and so still gives
+    every transaction the right year.
+
+    Args:
+        summary_text (str): Text of the statement's first page.
+
+    Returns:
+        pd.Timestamp: The statement date, or None if the page has no labelled date.
+    """
+    def to_timestamp(match):
+        day, month, year = match.groups()
+        number = MONTH_NUMBERS.get(month[:3].lower())
+        if number is None:
+            return None
+        try:
+            return pd.Timestamp(year=int(year), month=number, day=int(day))
+        except ValueError:
+            return None
+
+    for label in STATEMENT_DATE_LABELS:
+        for match in label.finditer(summary_text):
+            date = to_timestamp(match)
+            if date is not None:
+                return date
+
+    return None
+
+def summary_header_text(page):
+    """Return the text of the top SUMMARY_HEADER_SHARE of a statement's summary page."""
+    header = page.crop((0, 0, page.width, page.height * SUMMARY_HEADER_SHARE))
+    return header.extract_text() or ""
+
+def infer_statement_dates(days, months, statement_date=None):
+    """
+    Build dates from day and month numbers, giving each the latest year that does not
+    put it after the statement date.
+
+    Statements only print "DD Mon", so a statement running from December into January
+    gets its December transactions in the previous year.
+
+    Args:
+        days (pd.Series): Day of the month of each transaction.
+        months (pd.Series): Month number of each transaction.
+        statement_date (date-like): Date the statement was issued. Defaults to today.
+
+    Returns:
+        pd.Series: datetime64 dates, missing where the day does not exist in that month.
+    """
+    reference = pd.Timestamp(statement_date if statement_date is not None else datetime.now())
+    after_reference = (months > reference.month) | ((months == reference.month) & (days > reference.day))
+    years = reference.year - after_reference.astype("int64")
+
+    return pd.to_datetime(
+        pd.DataFrame({"year": years, "month": months, "day": days}), errors="coerce"
+    )
+
+def parse_transaction_lines(lines, statement_date=None):
+    """
+    Parse statement text lines into transactions in one vectorised step.
+
+    Lines that contain a header or footer phrase, or that do not start with a
+    "DD Mon" date and contain a "£" amount, are dropped.
+
+    Args:
+        lines (list): Text lines in statement order.
+        statement_date (date-like): Date the statement was issued, see infer_statement_dates.
+
+    Returns:
+        pd.DataFrame: Transactions in the canonical transaction schema (see utils.schema).
+    """
+    lines = pd.Series(lines, dtype=object)
+    lines = lines[~lines.str.contains(SKIP_LINE)]
+
+    parts = lines.str.extract(TRANSACTION_LINE).dropna(subset=["amount"])
+    months = parts["month"].str.lower().map(MONTH_NUMBERS)
+    parts = parts[months.notna()]
+    months = months[months.notna()].astype("int64")
+
+    dates = infer_statement_dates(parts["day"].astype("int64"), months, statement_date)
+    parts, dates = parts[dates.notna()], dates[dates.notna()]
+
+    amount_text = parts["amount"]
+    amounts = pd.to_numeric(amount_text.str.replace(r"CR|£|,", "", regex=True))
+
+    details = parts["details"].str.strip().where(parts["details"] != "", "Unknown")
+
+    credit = (
+        (amount_text.str.contains("CR", regex=False) | details.str.lower().str.contains("payment", regex=False))
+        & ~amount_text.str.startswith("-")
+    )
+
+    df = pd.DataFrame({
+        "Date": dates.to_numpy(),
+        "Year": dates.dt.year.to_numpy(),
+        "Month": month_names(dates),
+        "Details": details.to_numpy(),
+        "Amount": amounts.to_numpy(dtype="float64"),
+        "Debit/Credit": pd.Categorical.from_codes(credit.to_numpy().astype("int8"), dtype=TRANSACTION_TYPE_DTYPE),
+    }, columns=TRANSACTION_COLUMNS)
+
+    return to_canonical(df)
+
+def extract_transactions_from_pdf(pdf_path, debug = False, workers = 1, metrics = None, statement_date = None):
     """
     Extract transactions from a bank statement file.
     
     Args:
-        file_path (str): Path to the bank statement file.
+        pdf_path (str, bytes or file object): Path to the bank statement file, or its
+                                              contents as bytes or a binary stream.
         debug (bool): If True, print debug information.
+        workers (int): Most processes to extract pages with, capped at one per CPU; None
+                       uses one per CPU. The default extracts them serially in this process,
+                       as do statements of up to PARALLEL_PAGE_THRESHOLD pages.
+        metrics (Metrics): Where the extraction time and per-page times are recorded.
+        statement_date (date-like): Date the statement was issued, used to infer the year
+                                    of each transaction. Defaults to the date found on the
+                                    summary page (see parse_statement_date), then to today.
     
     Returns:
-        pd.DataFrame: A DataFrame containing extracted transactions with the following columns:
-                      ['Date', 'Details', 'Amount', 'Debit/Credit']
+        pd.DataFrame: A DataFrame in the canonical transaction schema (see utils.schema) with columns:
+                      ['Date', 'Year', 'Month', 'Details', 'Amount', 'Debit/Credit'].
+                      attrs["statement_date"] holds the statement date used as an ISO string,
+                      or None when it fell back to today.
     """
-    dates, descriptions, amounts, transaction_types = [], [], [], []
-    
-    with pdfplumber.open(pdf_path) as pdf:
-        for page_num, page in enumerate(pdf.pages):
-            width, height = page.width, page.height
-
-            # Split the page into left and right halves
-            left_part = page.crop((0, 0, width / 2, height))
-            right_part = page.crop((width / 2, 0, width, height))
-            
-            # Extract text from both halves and combine into a list of lines
-            page_lines = []
-            for part in (left_part, right_part):
-                text = part.extract_text()
-                if text:
-                    page_lines.extend(text.split("\n"))
-            
-            # Skip the first page (usually the summary)
-            if page_num == 0:
-                continue
-            
-            # Process each line to extract transaction details
-            for line in page_lines:
-
-                # Skip header/footer lines that are not transactions
-                if any(skip_word in line for skip_word in [
-                    "Page", 
-                    "Your transactions", 
-                    "Your previous balance", 
-                    "Payments towards your account", 
-                    "Understanding your interest"
-                ]):
-                    continue
-                
-                # Try to find a date at the start of the line
-                date_match = re.match(r'^(\d{1,2}\s+[A-Za-z]{3})', line)
-
-                # Try to find an amount somewhere in the line
-                amount_match = re.search(r'(-?£[\d,]+\.\d{2}(?:CR)?)', line)
-
-                if date_match and amount_match:
-                    date_str = date_match.group(1)
-
-                    # Extract and clean the amount
-                    amount_text = amount_match.group(1)
-                    amount_clean = float(amount_text.replace('CR', '').replace('£', '').replace(',', ''))
-    
-                    # Extract the transaction description
-                    start_idx = len(date_match.group(0))
-                    end_idx = line.rfind(amount_text)
-                    description = line[start_idx:end_idx].strip() if end_idx > start_idx else "Unknown"
-
-                    transaction_type = "Credit" if "CR" in amount_text or "payment" in description.lower() else "Debit"
-                    if amount_text.startswith('-'):
-                        transaction_type = "Debit"
-
-                    year = datetime.now().year
-                    date_obj = datetime.strptime(f"{date_str} {year}", "%d %b %Y")
-                    
-                    dates.append(date_obj.strftime("%Y-%m-%d"))
-                    descriptions.append(description)
-                    amounts.append(amount_clean)
-                    transaction_types.append(transaction_type)
+    metrics = metrics or Metrics()
+    extract_start = time.perf_counter()
+    pdf_path = as_binary_source(pdf_path)
 
-    if debug:
-        print(f"Extracted {len(dates)} transactions")
+    with open_pdf(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+        if statement_date is None and page_count:
+            # The one read of the summary page, cut down to the header that carries the dates
+            statement_date = parse_statement_date(summary_header_text(pdf.pages[0]))
+            if statement_date is None:
+                logger.warning("No statement date found on the summary page; inferring transaction years from today")
 
-    # Create DataFrame from extracted data
-    df = pd.DataFrame({
-        "Date": dates,
-        "Details": descriptions,
-        "Amount": amounts,
-        "Debit/Credit": transaction_types
-    })
+    workers = min(workers or os.cpu_count() or 1, os.cpu_count() or 1) if page_count > PARALLEL_PAGE_THRESHOLD else 1
+
+    # Skip the first page (usually the summary) before doing any work on it
+    page_ranges = split_page_ranges(1, page_count, workers) if page_count > 1 else []
 
-    df["Date"] = pd.to_datetime(df["Date"])
+    if workers > 1 and len(page_ranges) > 1:
+        # Workers cannot share an open stream, so in-memory PDFs are sent to them as bytes
+        source = pdf_path if isinstance(pdf_path, str) else as_binary_source(pdf_path).read()
+        with ProcessPoolExecutor(
+            max_workers=len(page_ranges), mp_context=multiprocessing.get_context(PAGE_POOL_START_METHOD)
+        ) as executor:
+            # map() yields results in submission order, so pages stay in statement order
+            range_results = list(executor.map(
+                extract_page_range_lines,
+                [source] * len(page_ranges),
+                [start for start, _ in page_ranges],
+                [stop for _, stop in page_ranges],
+            ))
+    else:
+        range_results = [extract_page_range_lines(pdf_path, start, stop) for start, stop in page_ranges]
 
-    df["Year"] = df["Date"].dt.year
-    df["Month"] = df["Date"].dt.strftime("%B")
+    lines = []
+    for page_lines, page_seconds in range_results:
+        lines.extend(page_lines)
+        for seconds in page_seconds:
+            metrics.observe("pdf_page_extract", seconds)
+    metrics.increment("pdf_pages", page_count)
 
-    df["Date"] = df["Date"].dt.strftime('%Y-%m-%d')
+    df = parse_transaction_lines(lines, statement_date)
+    df.attrs["statement_date"] = pd.Timestamp(statement_date).date().isoformat() if statement_date is not None else None
 
-    df = df[["Date", "Year", "Month", "Details", "Amount", "Debit/Credit"]]
+    if debug:
+        print(f"Extracted {len(df)} transactions")
 
+    metrics.increment("rows_extracted", len(df))
+    metrics.add_time("extract_pdf", time.perf_counter() - extract_start)
     return df
 
-def extract_transactions_from_csv(csv_path, debug = False):
+# Columns read from a Revolut export, with the dtypes they are parsed as
+REVOLUT_COLUMNS = {
+    "Completed Date": str,
+    "Description": str,
+    "Amount": "float64",
+}
+
+def normalise_revolut_chunk(df):
+    """
+    Convert rows of a Revolut export into the expected transaction format.
+
+    Args:
+        df (pd.DataFrame): Rows with the REVOLUT_COLUMNS columns.
+
+    Returns:
+        pd.DataFrame: Formatted transactions with a fresh index.
+    """
+    # Parse dates once and derive every date column from the result
+    completed = pd.to_datetime(df["Completed Date"])
+    amount = df["Amount"].to_numpy()
+
+    return to_canonical(pd.DataFrame({
+        "Date": completed.dt.normalize().to_numpy(),
+        "Year": completed.dt.year.to_numpy(),
+        "Month": month_names(completed),
+        "Details": df["Description"].to_numpy(),
+        "Amount": np.abs(amount),  # Remove negative sign, we'll handle type separately
+        # Determine transaction type (Credit or Debit)
+        "Debit/Credit": pd.Categorical.from_codes(
+            (amount >= 0).astype("int8"), dtype=TRANSACTION_TYPE_DTYPE
+        ),
+    }))
+
+def iter_transactions_from_csv(csv_path, chunksize = 100_000):
+    """
+    Stream transactions from a Revolut CSV statement in normalised chunks.
+
+    Only the needed columns are read, with explicit dtypes. Memory is bounded by the
+    chunk size as long as the caller releases each chunk before taking the next, as
+    the batch CLI does when it categorises and writes them one at a time.
+
+    Args:
+        csv_path (str, bytes or file object): Path to the Revolut CSV statement, or its
+                                              contents as bytes or a binary stream.
+        chunksize (int): Number of rows per chunk.
+
+    Yields:
+        pd.DataFrame: Formatted transactions for each chunk, indexed continuously.
+    """
+    offset = 0
+    csv_path = as_binary_source(csv_path)
+    with pd.read_csv(
+        csv_path,
+        usecols=list(REVOLUT_COLUMNS),
+        dtype=REVOLUT_COLUMNS,
+        chunksize=chunksize,
+        # Files on disk are memory-mapped rather than read through a buffer
+        memory_map=isinstance(csv_path, str),
+    ) as reader:
+        for chunk in reader:
+            transactions_df = normalise_revolut_chunk(chunk)
+            transactions_df.index = pd.RangeIndex(offset, offset + len(transactions_df))
+            offset += len(transactions_df)
+            yield transactions_df
+
+def extract_transactions_from_csv(csv_path, debug = False, metrics = None):
     """
     Extracts transactions from a Revolut CSV statement.
 
+    The whole statement is materialised: the chunks from iter_transactions_from_csv are
+    held and then concatenated, so peak memory is about twice the returned frame.
+
     Args:
-        csv_path (str): Path to the uploaded Revolut CSV statement.
+        csv_path (str, bytes or file object): Path to the Revolut CSV statement, or its
+                                              contents as bytes or a binary stream.
+        metrics (Metrics): Where the extraction time and chunk count are recorded.
 
     Returns:
-        pd.DataFrame: A DataFrame containing formatted transactions matching the expected format
+        pd.DataFrame: A DataFrame in the canonical transaction schema (see utils.schema)
     """
-    # Read the CSV file
-    df = pd.read_csv(csv_path)
-    
-    # Create a new DataFrame with the required columns
-    transactions_df = pd.DataFrame()
-    
-    # Extract and transform data
-    transactions_df["Date"] = pd.to_datetime(df["Completed Date"]).dt.strftime('%Y-%m-%d')
-    transactions_df["Details"] = df["Description"]
-    transactions_df["Amount"] = df["Amount"].abs()  # Remove negative sign, we'll handle type separately
-    
-    # Determine transaction type (Credit or Debit)
-    transactions_df["Debit/Credit"] = df["Amount"].apply(
-        lambda x: "Credit" if x >= 0 else "Debit"
-    )
-    
-    # Add year and month columns
-    transactions_df["Year"] = pd.to_datetime(df["Completed Date"]).dt.year
-    transactions_df["Month"] = pd.to_datetime(df["Completed Date"]).dt.strftime("%B")
-    
-    # Reorder columns to match expected format
-    transactions_df = transactions_df[["Date", "Year", "Month", "Details", "Amount", "Debit/Credit"]]
+    metrics = metrics or Metrics()
+    with metrics.timer("extract_csv"):
+        chunks = list(iter_transactions_from_csv(csv_path))
+    metrics.increment("csv_chunks", len(chunks))
+    if not chunks:
+        return normalise_revolut_chunk(pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in REVOLUT_COLUMNS.items()}))
+
+    transactions_df = pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+
+    if debug:
+        print(f"Extracted {len(transactions_df)} transactions")
+
+    metrics.increment("rows_extracted", len(transactions_df))
     
-    return transactions_df
\ No newline at end of file
+    return transactions_df
+
+# Registered statement formats by name, tried in registration order
+STATEMENT_FORMATS = {}
+
+# Bytes read from the start of a file to tell PDFs from CSVs and sniff CSV headers
+SNIFF_BYTES = 1024
+
+def register_format(name, kind, sniff, extractor, account_type, iter_chunks=None):
+    """
+    Register a bank statement format for detect_format.
+
+    Args:
+        name (str): Display name of the format, e.g. "Revolut".
+        kind (str): "pdf" or "csv".
+        sniff (callable): Returns True when given the first page's text (PDF) or the
+                          first SNIFF_BYTES of the file as text (CSV) of a statement
+                          in this format. It must not need more than that.
+        extractor (callable): Parser called as extractor(source, debug=False, metrics=None).
+        account_type (str): Account type statements in this format default to.
+        iter_chunks (callable): Optional streaming parser called as iter_chunks(source, chunksize),
+                                yielding the statement in canonical chunks.
+    """
+    STATEMENT_FORMATS[name] = {
+        "kind": kind,
+        "sniff": sniff,
+        "extractor": extractor,
+        "account_type": account_type,
+        "iter_chunks": iter_chunks,
+    }
+
+def read_head(source, size=SNIFF_BYTES):
+    """Return the first ``size`` bytes of a statement, leaving streams rewound."""
+    source = as_binary_source(source)
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read(size)
+
+    head = source.read(size)
+    source.seek(0)
+    return head
+
+def first_page_text(source):
+    """Return the text of the first page of a PDF statement, parsing no other page."""
+    with open_pdf(source, pages=[1]) as pdf:
+        return (pdf.pages[0].extract_text() or "") if pdf.pages else ""
+
+def detect_format(source):
+    """
+    Return the name of the registered format a statement is in, or None.
+
+    Only the first SNIFF_BYTES of the file, plus the first page for PDFs, are read.
+
+    Args:
+        source (str, bytes or file object): The statement.
+
+    Returns:
+        str: A key of STATEMENT_FORMATS, or None if no format matches.
+    """
+    head = read_head(source)
+    if head.startswith(b"%PDF"):
+        kind, text = "pdf", first_page_text(source)
+    else:
+        kind, text = "csv", head.decode("utf-8-sig", errors="replace")
+
+    for name, statement_format in STATEMENT_FORMATS.items():
+        if statement_format["kind"] == kind and statement_format["sniff"](text):
+            return name
+
+    return None
+
+def formats_for_account_type(account_type):
+    """Return the names of the formats whose statements default to ``account_type``."""
+    return [name for name, statement_format in STATEMENT_FORMATS.items() if statement_format["account_type"] == account_type]
+
+# Phrases on the summary page of a Barclaycard statement
+BARCLAYCARD_SIGNATURE = re.compile("Barclaycard|Your previous balance|Payments towards your account", re.IGNORECASE)
+
+def is_barclaycard_statement(first_page):
+    """Return whether the first page text looks like a Barclaycard statement."""
+    return BARCLAYCARD_SIGNATURE.search(first_page) is not None
+
+def is_revolut_export(head):
+    """Return whether the start of a CSV file has the columns of a Revolut export."""
+    header = next(csv.reader(io.StringIO(head)), [])
+    return set(REVOLUT_COLUMNS) <= {column.strip() for column in header}
+
+register_format("Barclays Credit Card", "pdf", is_barclaycard_statement, extract_transactions_from_pdf, "A")
+register_format("Revolut", "csv", is_revolut_export, extract_transactions_from_csv, "C", iter_chunks=iter_transactions_from_csv)
@@ -0,0 +1,178 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import pandas as pd
+from utils.matcher import is_literal
+
+def transaction_fingerprints(df, account_type):
+    """
+    Return a stable fingerprint for every transaction.
+
+    The fingerprint hashes the account type, the date, the whitespace-normalised
+    lowercase description and the signed amount, so the same transaction gets the
+    same fingerprint in every statement it appears in.
+
+    Args:
+        df (pd.DataFrame): DataFrame with transactions
+        account_type (str): The type of account
+
+    Returns:
+        pd.Series: Hex fingerprints, aligned with the DataFrame
+    """
+    dates = pd.to_datetime(df["Date"]).dt.strftime("%Y-%m-%d").fillna("")
+    details = (
+        df["Details"].astype(object).fillna("").astype(str)
+        .str.replace(r"\s+", " ", regex=True).str.strip().str.lower()
+    )
+    amounts = df["Amount"].astype(float)
+    if "Debit/Credit" in df.columns:
+        amounts = amounts.where(df["Debit/Credit"].astype(object) != "Debit", -amounts)
+
+    keys = (
+        f"{account_type}\x1f" + dates.astype(object) + "\x1f" + details.astype(object)
+        + "\x1f" + amounts.map("{:.2f}".format).astype(object)
+    )
+    return pd.Series(
+        [hashlib.blake2b(key.encode(), digest_size=16).hexdigest() for key in keys],
+        index=df.index,
+        dtype=object,
+    )
+
+class TransactionStore:
+    """
+    Persistent SQLite store of categorised transactions keyed by fingerprint.
+
+    Stored categories are only valid for the rule set they were produced with.
+    ``sync_rules`` drops them all when categories.json changed outside the app,
+    and ``invalidate_matching`` drops only the rows a newly approved pattern
+    could recategorise.
+    """
+
+    def __init__(self, db_file="transactions.db"):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_file, check_same_thread=False)
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS categorised_transactions (
+                fingerprint TEXT PRIMARY KEY,
+                details TEXT NOT NULL,
+                category TEXT NOT NULL,
+                source TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS store_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        self._connection.commit()
+
+    def sync_rules(self, rules_hash):
+        """
+        Drop every stored category if the rule set differs from the one they were produced with.
+
+        Args:
+            rules_hash (str): Hash of the current categories file
+
+        Returns:
+            bool: True if stored categories were dropped
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM store_meta WHERE key = 'rules_hash'").fetchone()
+            changed = row is not None and row[0] != rules_hash
+            if changed:
+                self._connection.execute("DELETE FROM categorised_transactions")
+            self._set_rules_hash(rules_hash)
+            self._connection.commit()
+        return changed
+
+    def set_rules_hash(self, rules_hash):
+        """Record the rule set that the stored categories are valid for."""
+        with self._lock:
+            self._set_rules_hash(rules_hash)
+            self._connection.commit()
+
+    def _set_rules_hash(self, rules_hash):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('rules_hash', ?)", (rules_hash,)
+        )
+
+    def get_many(self, fingerprints):
+        """
+        Look up stored categories.
+
+        Args:
+            fingerprints (list): Transaction fingerprints
+
+        Returns:
+            dict: Fingerprint → (category, source) for every stored transaction
+        """
+        found = {}
+        unique = list(dict.fromkeys(fingerprints))
+        with self._lock:
+            # Stay well below SQLite's limit on bound parameters per statement
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                rows = self._connection.execute(
+                    f"""
+                    SELECT fingerprint, category, source FROM categorised_transactions
+                    WHERE fingerprint IN ({", ".join("?" * len(batch))})
+                    """,
+                    batch,
+                ).fetchall()
+                found.update((fingerprint, (category, source)) for fingerprint, category, source in rows)
+        return found
+
+    def set_many(self, entries):
+        """
+        Store categorised transactions.
+
+        Args:
+            entries (list): (fingerprint, details, category, source) tuples, where
+                            source is "pattern" or "llm"
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                """
+                INSERT OR REPLACE INTO categorised_transactions
+                    (fingerprint, details, category, source, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                [
+                    (fingerprint, str(details).lower(), category, source, now)
+                    for fingerprint, details, category, source in entries
+                ],
+            )
+            self._connection.commit()
+
+    def invalidate_matching(self, patterns):
+        """
+        Drop stored transactions whose description contains any of the given patterns.
+
+        Patterns that are not plain substrings could match anything, so they drop every stored transaction.
+
+        Args:
+            patterns (list): Learned patterns that were added or changed
+
+        Returns:
+            int: Number of transactions dropped
+        """
+        with self._lock:
+            if all(is_literal(pattern) for pattern in patterns):
+                dropped = 0
+                for pattern in patterns:
+                    dropped += self._connection.execute(
+                        "DELETE FROM categorised_transactions WHERE instr(details, ?) > 0", (pattern,)
+                    ).rowcount
+            else:
+                dropped = self._connection.execute("DELETE FROM categorised_transactions").rowcount
+            self._connection.commit()
+        return dropped
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._connection.close()
@@ -1,24 +1,213 @@
+import numpy as np
 import streamlit as st
 import pandas as pd
+from utils.analytics import budget_vs_actual, detect_recurring, rolling_average, spending_by_month
+from utils.metrics import format_prometheus
 
-def display_transaction_table(transactions_df):
+# Rows sent to the browser per page of a transaction table
+PAGE_SIZE = 100
+
+# Sort option that keeps statement order
+STATEMENT_ORDER = "Statement order"
+
+def transaction_positions(transactions_df, search="", categories=None, sort_by=None, descending=False):
+    """
+    Return the row positions to show, filtered and sorted without copying the frame.
+
+    Args:
+        transactions_df (pd.DataFrame): DataFrame containing transaction data.
+        search (str): Case-insensitive text the Details must contain.
+        categories (list): Categories to keep, or None/empty for all.
+        sort_by (str): Column to sort by, or None for statement order.
+        descending (bool): Sort in descending order.
+
+    Returns:
+        np.ndarray: Positions of the matching rows, in display order.
     """
-    Display a table of transactions in Streamlit.
+    mask = np.ones(len(transactions_df), dtype=bool)
+    if search and "Details" in transactions_df.columns:
+        mask &= transactions_df["Details"].str.contains(search, case=False, regex=False, na=False).to_numpy(dtype=bool)
+    if categories and "Category" in transactions_df.columns:
+        mask &= transactions_df["Category"].isin(categories).to_numpy()
+
+    positions = np.flatnonzero(mask)
+    if sort_by is None or sort_by not in transactions_df.columns:
+        return positions if not descending else positions[::-1]
+
+    # Only the sort column is gathered; categoricals such as Month sort in their own order
+    keys = transactions_df[sort_by].iloc[positions].reset_index(drop=True)
+    order = keys.sort_values(ascending=not descending, kind="stable", na_position="last").index.to_numpy()
+    return positions[order]
+
+def display_transaction_table(transactions_df, key="transactions", page_size=PAGE_SIZE):
+    """
+    Display a table of transactions in Streamlit, one page at a time.
+
+    Filtering, sorting and paging happen on the server, so only the rows of the current
+    page are copied and sent to the browser. Amount stays numeric and is formatted by
+    the table itself.
     
     Args:
         transactions_df (pd.DataFrame): DataFrame containing transaction data.
+        key (str): Prefix for the widget keys, unique for each table on the page.
+        page_size (int): Rows per page.
     """
     st.subheader("Transaction Table")
-    
-    display_df = transactions_df.copy()
 
-    display_df["Transaction #"] = range(1, len(display_df) + 1)
+    search_column, category_column, sort_column, order_column = st.columns([3, 3, 2, 1])
+    with search_column:
+        search = st.text_input("Search details", key=f"{key}_search")
+    with category_column:
+        categories = None
+        if "Category" in transactions_df.columns:
+            options = sorted(transactions_df["Category"].dropna().unique().tolist())
+            categories = st.multiselect("Categories", options, key=f"{key}_categories")
+    with sort_column:
+        sort_by = st.selectbox("Sort by", [STATEMENT_ORDER] + list(transactions_df.columns), key=f"{key}_sort")
+    with order_column:
+        descending = st.toggle("Descending", key=f"{key}_descending")
+
+    positions = transaction_positions(
+        transactions_df, search, categories, None if sort_by == STATEMENT_ORDER else sort_by, descending
+    )
+
+    page_count = max(1, -(-len(positions) // page_size))
+    page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1, key=f"{key}_page")
+    page_positions = positions[(page - 1) * page_size:page * page_size]
 
-    columns = ["Transaction #"] + [column for column in display_df.columns if column != "Transaction #"]
-    display_df = display_df[columns]
+    display_df = transactions_df.iloc[page_positions]
+    display_df.insert(0, "Transaction #", page_positions + 1)
 
-    if 'Amount' in display_df.columns:
-        display_df["Amount"] = display_df["Amount"].apply(lambda x: f"£{x:,.2f}")
+    st.dataframe(
+        display_df,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "Transaction #": st.column_config.NumberColumn(format="%d"),
+            "Date": st.column_config.DateColumn(format="YYYY-MM-DD"),
+            "Year": st.column_config.NumberColumn(format="%d"),
+            "Amount": st.column_config.NumberColumn(format="£%.2f"),
+        },
+    )
 
-    st.dataframe(display_df, use_container_width=True, hide_index=True)
+    if len(positions):
+        first = (page - 1) * page_size + 1
+        st.caption(
+            f"Showing {first}–{first + len(page_positions) - 1} of {len(positions)} transactions"
+            + (f" (filtered from {len(transactions_df)})" if len(positions) != len(transactions_df) else "")
+        )
+    else:
+        st.caption(f"No transactions match (of {len(transactions_df)})")
 
+def display_performance_panel(snapshot):
+    """
+    Display extraction and categorisation metrics in a collapsible panel.
+
+    Args:
+        snapshot (dict): Output of Metrics.as_dict().
+    """
+    with st.expander("Performance"):
+        timers = snapshot.get("timers", {})
+        counters = snapshot.get("counters", {})
+        histograms = snapshot.get("histograms", {})
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("Timings")
+            st.dataframe(
+                pd.DataFrame({"Step": list(timers), "Seconds": list(timers.values())}),
+                use_container_width=True, hide_index=True
+            )
+        with col2:
+            st.write("Counters")
+            st.dataframe(
+                pd.DataFrame({"Counter": list(counters), "Value": list(counters.values())}),
+                use_container_width=True, hide_index=True
+            )
+
+        lookups = counters.get("llm_cache_hits", 0) + counters.get("llm_cache_misses", 0)
+        if lookups:
+            st.metric("LLM cache hit rate", f"{counters.get('llm_cache_hits', 0) / lookups:.0%}")
+
+        if "llm_latency" in histograms:
+            st.write("LLM request latency (requests per bucket, seconds)")
+            buckets = histograms["llm_latency"]["buckets"]
+            # Bucket counts are cumulative, so difference them for the count in each bucket
+            cumulative = pd.Series(list(buckets.values()), index=[f"≤ {bound}" for bound in buckets])
+            st.bar_chart(cumulative.diff().fillna(cumulative).rename("Requests"))
+
+        if "pdf_page_extract" in histograms:
+            st.write("Extraction time per page (seconds)")
+            page_seconds = histograms["pdf_page_extract"]["values"]
+            # The summary page is skipped, so transaction pages start at page 2
+            st.line_chart(pd.Series(page_seconds, index=range(2, len(page_seconds) + 2), name="Seconds"))
+
+        st.download_button(
+            "Download metrics (Prometheus format)",
+            format_prometheus(snapshot),
+            file_name="finance_tracker.prom",
+            mime="text/plain"
+        )
+
+def display_spending_analytics(monthly, transactions_df, budgets=None):
+    """
+    Display spending trends, budgets and recurring payments.
+
+    Args:
+        monthly (pd.DataFrame): Monthly totals, from analytics.monthly_totals or TransactionWarehouse.monthly_summary.
+        transactions_df (pd.DataFrame): Recent transactions, searched for recurring payments.
+        budgets (dict): Monthly budget per category, if any.
+    """
+    with st.expander("Spending Analytics"):
+        spending = spending_by_month(monthly)
+        if spending.empty:
+            st.info("No transaction history yet.")
+            return
+
+        chart_index = spending.index.strftime("%Y-%m")
+        st.write("Monthly spending by category")
+        st.bar_chart(spending.set_axis(chart_index))
+        st.write("Three-month rolling average")
+        st.line_chart(rolling_average(spending, window=3).set_axis(chart_index))
+
+        if budgets:
+            st.write("Budget vs actual, latest month")
+            comparison = budget_vs_actual(spending.tail(1), budgets).drop(columns="Period")
+            st.dataframe(
+                comparison,
+                use_container_width=True, hide_index=True,
+                column_config={
+                    "Budget": st.column_config.NumberColumn(format="£%.2f"),
+                    "Actual": st.column_config.NumberColumn(format="£%.2f"),
+                    "Remaining": st.column_config.NumberColumn(format="£%.2f"),
+                    "Used": st.column_config.ProgressColumn(format="percent", min_value=0, max_value=1),
+                }
+            )
+
+        recurring = detect_recurring(transactions_df)
+        st.write(f"Recurring payments ({len(recurring)})")
+        st.dataframe(
+            recurring,
+            use_container_width=True, hide_index=True,
+            column_config={"Amount": st.column_config.NumberColumn(format="£%.2f")}
+        )
+
+def display_job_progress(jobs, on_retry=None):
+    """
+    Display a progress bar per background job, with its current stage.
+
+    Args:
+        jobs (list): Job objects from utils.job_queue.
+        on_retry (callable): Called with a failed job when the user asks to retry it;
+                             without it failed jobs only show their error.
+    """
+    for job in jobs:
+        if job.status == "failed":
+            st.error(f"{job.name}: {job.error}")
+            if on_retry is not None and st.button(f"Retry {job.name}", key=f"retry_{job.id}"):
+                on_retry(job)
+        else:
+            label = f"{job.name}: {job.stage}"
+            if job.started is not None:
+                label += f" ({job.elapsed():.0f}s)"
+            st.progress(job.progress, text=label)
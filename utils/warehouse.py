@@ -0,0 +1,307 @@
+import sqlite3
+import threading
+import pandas as pd
+from utils.categoriser import extract_merchant
+from utils.schema import to_canonical
+from utils.transaction_store import transaction_fingerprints
+
+# Warehouse column → canonical transaction column
+COLUMN_NAMES = {
+    "date": "Date",
+    "year": "Year",
+    "month": "Month",
+    "details": "Details",
+    "amount": "Amount",
+    "debit_credit": "Debit/Credit",
+    "account_type": "Account Type",
+    "category": "Category",
+    "merchant": "Merchant",
+}
+
+# Columns totals() can group by
+GROUP_COLUMNS = {"year", "month", "category", "account_type", "merchant", "debit_credit"}
+
+class TransactionWarehouse:
+    """
+    Local SQLite history of every extracted and categorised transaction.
+
+    Rows are keyed by transaction fingerprint plus its occurrence within the upload,
+    so re-importing an overlapping statement updates rows instead of duplicating
+    them, while genuinely repeated transactions on the same day are all kept.
+    Indexes on date, category, merchant and account/month back the query API.
+    """
+
+    def __init__(self, db_file="warehouse.db"):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_file, check_same_thread=False)
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS transactions (
+                fingerprint TEXT NOT NULL,
+                occurrence INTEGER NOT NULL,
+                date TEXT,
+                year INTEGER,
+                month INTEGER,
+                details TEXT,
+                merchant TEXT,
+                amount REAL,
+                debit_credit TEXT,
+                account_type TEXT,
+                category TEXT,
+                PRIMARY KEY (fingerprint, occurrence)
+            );
+            CREATE INDEX IF NOT EXISTS transactions_date ON transactions (date);
+            CREATE INDEX IF NOT EXISTS transactions_category ON transactions (category, date);
+            CREATE INDEX IF NOT EXISTS transactions_merchant ON transactions (merchant, date);
+            CREATE INDEX IF NOT EXISTS transactions_account_month ON transactions (account_type, year, month);
+            CREATE TABLE IF NOT EXISTS monthly_summary (
+                account_type TEXT NOT NULL,
+                year INTEGER NOT NULL,
+                month INTEGER NOT NULL,
+                category TEXT NOT NULL,
+                debit REAL NOT NULL,
+                credit REAL NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (account_type, year, month, category)
+            );
+            """
+        )
+        self._connection.commit()
+
+        # Warehouses created before the summary table existed get it filled once
+        has_summary = self._connection.execute("SELECT 1 FROM monthly_summary LIMIT 1").fetchone()
+        has_transactions = self._connection.execute("SELECT 1 FROM transactions LIMIT 1").fetchone()
+        if has_transactions and not has_summary:
+            self.rebuild_monthly_summary()
+
+    def add_transactions(self, df, account_type=None):
+        """
+        Insert or update categorised transactions.
+
+        Args:
+            df (pd.DataFrame): Transactions as returned by categorize_transactions
+            account_type (str): The type of account, if the DataFrame has no 'Account Type' column
+
+        Returns:
+            int: Number of transactions written
+        """
+        if df.empty:
+            return 0
+
+        if account_type is None:
+            account_type = str(df["Account Type"].iloc[0])
+
+        fingerprints = transaction_fingerprints(df, account_type)
+        occurrences = fingerprints.groupby(fingerprints).cumcount()
+        dates = pd.to_datetime(df["Date"])
+        details = df["Details"].astype(object).where(df["Details"].notna(), None)
+        categories = (
+            df["Category"].astype(object).where(df["Category"].notna(), None)
+            if "Category" in df.columns else [None] * len(df)
+        )
+
+        rows = zip(
+            fingerprints,
+            occurrences.tolist(),
+            dates.dt.strftime("%Y-%m-%d").astype(object).where(dates.notna(), None),
+            dates.dt.year.astype(object).where(dates.notna(), None),
+            dates.dt.month.astype(object).where(dates.notna(), None),
+            details,
+            [extract_merchant(text) or None for text in details],
+            df["Amount"].astype(float).tolist(),
+            df["Debit/Credit"].astype(object).tolist(),
+            [account_type] * len(df),
+            categories,
+        )
+
+        with self._lock:
+            self._connection.executemany(
+                """
+                INSERT OR REPLACE INTO transactions
+                    (fingerprint, occurrence, date, year, month, details, merchant,
+                     amount, debit_credit, account_type, category)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            months = {
+                (account_type, int(year), int(month))
+                for year, month in zip(dates.dt.year[dates.notna()], dates.dt.month[dates.notna()])
+            }
+            self._refresh_monthly_summary(months)
+            self._connection.commit()
+
+        return len(df)
+
+    def _refresh_monthly_summary(self, months):
+        """Recompute the summary rows of the given (account type, year, month) groups; the caller holds the lock."""
+        self._connection.executemany(
+            "DELETE FROM monthly_summary WHERE account_type = ? AND year = ? AND month = ?",
+            list(months),
+        )
+        self._connection.executemany(
+            """
+            INSERT INTO monthly_summary (account_type, year, month, category, debit, credit, count)
+            SELECT account_type, year, month, COALESCE(category, ''),
+                SUM(CASE WHEN debit_credit = 'Debit' THEN amount ELSE 0 END),
+                SUM(CASE WHEN debit_credit = 'Credit' THEN amount ELSE 0 END),
+                COUNT(*)
+            FROM transactions
+            WHERE account_type = ? AND year = ? AND month = ?
+            GROUP BY account_type, year, month, COALESCE(category, '')
+            """,
+            list(months),
+        )
+
+    def rebuild_monthly_summary(self):
+        """Recompute the whole monthly summary table from the stored transactions."""
+        with self._lock:
+            months = self._connection.execute(
+                "SELECT DISTINCT account_type, year, month FROM transactions WHERE year IS NOT NULL"
+            ).fetchall()
+            self._connection.execute("DELETE FROM monthly_summary")
+            self._refresh_monthly_summary(months)
+            self._connection.commit()
+
+    def monthly_summary(self, start=None, end=None, category=None, account_type=None):
+        """
+        Read the materialised per-month, per-category totals.
+
+        The summary is kept up to date by add_transactions, so reading it never scans
+        the individual transactions.
+
+        Args:
+            start: First month to include (anything pd.Timestamp accepts)
+            end: Last month to include
+            category (str): Only this category
+            account_type (str): Only this account type
+
+        Returns:
+            pd.DataFrame: 'Period' (monthly pd.Period), 'Account Type', 'Category', 'Debit', 'Credit'
+                          and 'Count' columns, oldest month first
+        """
+        clauses, params = [], []
+        if start is not None:
+            start = pd.Timestamp(start)
+            clauses.append("year * 12 + month >= ?")
+            params.append(start.year * 12 + start.month)
+        if end is not None:
+            end = pd.Timestamp(end)
+            clauses.append("year * 12 + month <= ?")
+            params.append(end.year * 12 + end.month)
+        if category is not None:
+            clauses.append("category = ?")
+            params.append(category)
+        if account_type is not None:
+            clauses.append("account_type = ?")
+            params.append(account_type)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+
+        with self._lock:
+            df = pd.read_sql_query(
+                f"""
+                SELECT year, month, account_type, category, debit, credit, count
+                FROM monthly_summary{where}
+                ORDER BY year, month, account_type, category
+                """,
+                self._connection,
+                params=params,
+            )
+
+        periods = pd.PeriodIndex.from_fields(year=df["year"], month=df["month"], freq="M")
+        return pd.DataFrame({
+            "Period": periods,
+            "Account Type": df["account_type"].astype("category"),
+            "Category": df["category"].replace("", None).astype("category"),
+            "Debit": df["debit"],
+            "Credit": df["credit"],
+            "Count": df["count"],
+        })
+
+    def _where(self, start=None, end=None, category=None, account_type=None, merchant=None):
+        """Build the WHERE clause and parameters shared by the query methods."""
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("date >= ?")
+            params.append(pd.Timestamp(start).strftime("%Y-%m-%d"))
+        if end is not None:
+            clauses.append("date <= ?")
+            params.append(pd.Timestamp(end).strftime("%Y-%m-%d"))
+        if category is not None:
+            clauses.append("category = ?")
+            params.append(category)
+        if account_type is not None:
+            clauses.append("account_type = ?")
+            params.append(account_type)
+        if merchant is not None:
+            clauses.append("merchant = ?")
+            params.append(merchant.lower())
+
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, start=None, end=None, category=None, account_type=None, merchant=None):
+        """
+        Return stored transactions, oldest first.
+
+        Args:
+            start: First date to include (anything pd.Timestamp accepts)
+            end: Last date to include
+            category (str): Only this category
+            account_type (str): Only this account type
+            merchant (str): Only this merchant, as returned by extract_merchant
+
+        Returns:
+            pd.DataFrame: Transactions in the canonical schema, plus a 'Merchant' column
+        """
+        where, params = self._where(start, end, category, account_type, merchant)
+        with self._lock:
+            df = pd.read_sql_query(
+                f"""
+                SELECT date, year, month, details, amount, debit_credit, account_type, category, merchant
+                FROM transactions{where}
+                ORDER BY date, rowid
+                """,
+                self._connection,
+                params=params,
+            )
+
+        df["month"] = pd.to_datetime(df["date"]).dt.month_name()
+        return to_canonical(df.rename(columns=COLUMN_NAMES))
+
+    def totals(self, by=("year", "month", "category"), start=None, end=None, category=None, account_type=None, merchant=None):
+        """
+        Aggregate stored transactions in SQL.
+
+        Args:
+            by (tuple): Columns to group by, from GROUP_COLUMNS
+            start, end, category, account_type, merchant: Filters, as in query()
+
+        Returns:
+            pd.DataFrame: One row per group with 'Debit', 'Credit' and 'Count' columns
+        """
+        unknown = set(by) - GROUP_COLUMNS
+        if unknown:
+            raise ValueError(f"Cannot group by {sorted(unknown)}")
+
+        where, params = self._where(start, end, category, account_type, merchant)
+        group = ", ".join(by)
+        with self._lock:
+            df = pd.read_sql_query(
+                f"""
+                SELECT {group + "," if by else ""}
+                    SUM(CASE WHEN debit_credit = 'Debit' THEN amount ELSE 0 END) AS debit,
+                    SUM(CASE WHEN debit_credit = 'Credit' THEN amount ELSE 0 END) AS credit,
+                    COUNT(*) AS count
+                FROM transactions{where}
+                {"GROUP BY " + group + " ORDER BY " + group if by else ""}
+                """,
+                self._connection,
+                params=params,
+            )
+
+        return df.rename(columns={**COLUMN_NAMES, "debit": "Debit", "credit": "Credit", "count": "Count"})
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._connection.close()